@@ -1,20 +1,17 @@
 #!/bin/sh
+set -e
 
-# Ce script est exécuté par le conteneur 'web' au démarrage.
+# Ce script est exécuté par le conteneur 'web' au démarrage. Les fichiers
+# statiques sont collectés à la construction de l'image (Dockerfile) ; les
+# migrations relèvent de la release (release.sh), lancée ici sauf si
+# RUN_RELEASE=0 : release faite à part (pre-deploy de render.yaml, service
+# 'release' de docker-compose).
+if [ "${RUN_RELEASE:-1}" = "1" ]; then
+    sh "$(dirname "$0")/release.sh"
+fi
 
-# Appliquer les migrations de la base de données
-echo "Applying database migrations..."
-python manage.py makemigrations
-python manage.py migrate --noinput
-
-# Collecter les fichiers statiques
-echo "Collecting static files..."
-python manage.py collectstatic --noinput
-
-# Créer un superutilisateur par défaut si nécessaire
-echo "Creating default superuser..."
-python manage.py createsuperuser --no-input || true
-
-# Lancer Gunicorn pour servir l'application
+# Lancer Gunicorn pour servir l'application (ASGI, workers uvicorn, application
+# préchargée dans le maître : voir gunicorn.conf.py). exec : gunicorn reçoit
+# directement les signaux d'arrêt du conteneur.
 echo "Starting Gunicorn..."
-gunicorn --bind 0.0.0.0:8000 --reload messagerie.wsgi:application
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py messagerie.asgi:application
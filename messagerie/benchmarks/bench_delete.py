@@ -0,0 +1,55 @@
+"""
+Purge de N messages d'un utilisateur (100 000 par défaut) : suppression
+historique en une fois (``filter(id__in=...).delete()``) contre le moteur
+par lots de ``mymessages.deletion``.
+
+    cd messagerie
+    python -m benchmarks.bench_delete --messages 100000
+"""
+
+import argparse
+import tracemalloc
+
+from benchmarks.common import seed_messages, setup, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import transaction
+    from mymessages import deletion, stats, summary
+    from mymessages.models import Message
+
+    def collector_delete():
+        ids = list(Message.objects.values_list('id', flat=True))
+        with transaction.atomic(), stats.batch(), summary.batch():
+            return Message.objects.filter(id__in=ids).delete()[0]
+
+    def chunked_delete():
+        return deletion.delete_messages(
+            Message.objects.all(), chunk_size=args.chunk_size)
+
+    print(f"Purge de {args.messages} messages")
+    for name, func in (('collector', collector_delete), ('chunked', chunked_delete)):
+        # Un seul utilisateur : tous les messages lui appartiennent
+        seed_messages(1, args.messages)
+        tracemalloc.start()
+        try:
+            deleted, elapsed = timed(func)
+        except Exception as exc:
+            print(f"{name:>10} : échec ({type(exc).__name__}: {exc})")
+            Message.objects.all().delete()
+            continue
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print(f"{name:>10} : {deleted} supprimés en {elapsed:.2f} s, "
+              f"{deleted / elapsed:.0f} messages/s, pic mémoire {peak / 2**20:.1f} Mo")
+
+
+if __name__ == '__main__':
+    main()
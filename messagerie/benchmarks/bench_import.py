@@ -0,0 +1,88 @@
+"""
+Débit de l'import CSV (lignes/s) : boucle ligne par ligne historique,
+backend ``orm`` par lots, et backend ``copy`` quand la base est PostgreSQL.
+
+    cd messagerie
+    python -m benchmarks.bench_import --rows 10000
+    BENCH_DATABASE_URL=postgres://... python -m benchmarks.bench_import
+"""
+
+import argparse
+import csv
+import io
+import warnings
+
+from benchmarks.common import setup, timed
+
+
+def row_by_row_import(csv_file):
+    """Implémentation d'origine : trois requêtes par ligne."""
+    from django.contrib.auth.models import User
+    from mymessages.models import Message
+
+    reader = csv.reader(csv_file.read().decode('utf-8').splitlines())
+    success_count = 0
+    error_count = 0
+    # Les dates naïves passées telles quelles déclenchent un avertissement par ligne
+    warnings.simplefilter('ignore', RuntimeWarning)
+    for row in reader:
+        if row:
+            try:
+                user = User.objects.get(username=row[2])
+                recipient = None
+                if len(row) > 3 and row[3]:
+                    recipient = User.objects.filter(username=row[3]).first()
+                Message.objects.create(
+                    contenu=row[0], date_envoi=row[1], owner=user, recipient=recipient)
+                success_count += 1
+            except Exception:
+                error_count += 1
+    return success_count, error_count
+
+
+def make_csv(rows, users):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i in range(rows):
+        writer.writerow([f"Message de benchmark n°{i}", "2024-01-01 12:00:00",
+                         users[i % len(users)], users[(i + 1) % len(users)]])
+    return buffer.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.models import User
+    from django.core.files.base import ContentFile
+    from django.db import connection
+    from mymessages.models import Message
+    from mymessages.services import MessageImportService, PostgresCopyWriter
+
+    usernames = [f"bench_user_{i}" for i in range(args.users)]
+    User.objects.bulk_create(
+        [User(username=name) for name in usernames], ignore_conflicts=True)
+    content = make_csv(args.rows, usernames)
+
+    strategies = [
+        ('ligne par ligne', row_by_row_import),
+        ('orm par lots', MessageImportService(args.batch_size, 'orm').import_csv),
+    ]
+    if PostgresCopyWriter.is_available():
+        strategies.append(
+            ('copy', MessageImportService(args.batch_size, 'copy').import_csv))
+
+    print(f"{args.rows} lignes, base {connection.vendor}")
+    for name, import_csv in strategies:
+        Message.objects.all().delete()
+        (success_count, _), elapsed = timed(import_csv, ContentFile(content))
+        print(f"{name:>16} : {elapsed:8.2f} s  {success_count / elapsed:10.0f} lignes/s")
+    Message.objects.all().delete()
+
+
+if __name__ == '__main__':
+    main()
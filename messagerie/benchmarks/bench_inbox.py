@@ -0,0 +1,53 @@
+"""
+Latence de la boîte de messages (p50/p95) : requête OR d'origine contre
+fusion de deux sous-requêtes indexées (InboxQuery), pages 1 et 100.
+
+    cd messagerie
+    python -m benchmarks.bench_inbox --messages 1000000
+"""
+
+import argparse
+
+from benchmarks.common import seed_messages, setup, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.models import User
+    from django.core.paginator import Paginator
+    from django.db.models import Q
+    from mymessages.inbox import InboxQuery
+    from mymessages.models import Message
+
+    seed_messages(args.users, args.messages)
+    # L'utilisateur le plus actif : le cas le plus coûteux
+    user = User.objects.filter(username='bench_0').get()
+
+    strategies = {
+        'or': lambda: Message.objects.filter(
+            Q(owner=user) | Q(recipient=user)).order_by('-date_envoi').select_related(
+            'owner', 'recipient'),
+        'union': lambda: InboxQuery(user),
+    }
+    print(f"{args.messages} messages, {args.users} utilisateurs")
+    for page in (1, 100):
+        for name, build in strategies.items():
+            samples = []
+            for _ in range(args.repeat):
+                _, elapsed = timed(lambda: list(
+                    Paginator(build(), args.per_page).page(page).object_list))
+                samples.append(elapsed)
+            result = summarize(samples)
+            print(f"page {page:>3} {name:>6} : p50 {result['p50_ms']:8.2f} ms  "
+                  f"p95 {result['p95_ms']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Rendu d'une page de la boîte (p50/p95) : templates relus à chaque rendu,
+templates compilés en cache, puis compilés avec le cache des lignes
+(templatetag ``message_rows``) déjà rempli.
+
+    cd messagerie
+    python -m benchmarks.bench_render --rows 100
+"""
+
+import argparse
+
+from benchmarks.common import seed_messages, setup, summarize, timed
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory, override_settings
+    from mymessages.inbox import InboxQuery
+
+    seed_messages(args.users, args.messages)
+    user = User.objects.get(username='bench_0')
+    request = RequestFactory().get('/messages/')
+    request.user = user
+    # Requête faite une fois : seul le rendu est mesuré
+    messages = list(InboxQuery(user)[:args.rows])
+
+    def templates(loaders):
+        return [{**settings.TEMPLATES[0], 'APP_DIRS': False,
+                 'OPTIONS': {**settings.TEMPLATES[0]['OPTIONS'], 'loaders': loaders}}]
+
+    configs = {
+        'sans cache': (templates(LOADERS), 0),
+        'compilés': (templates([('django.template.loaders.cached.Loader', LOADERS)]), 0),
+        'compilés + lignes': (templates([('django.template.loaders.cached.Loader', LOADERS)]), 3600),
+    }
+    print(f"{args.rows} lignes, {args.repeat} rendus")
+    for name, (engine, row_timeout) in configs.items():
+        cache.clear()
+        with override_settings(TEMPLATES=engine, MESSAGE_ROW_CACHE_TIMEOUT=row_timeout):
+            def render():
+                return render_to_string('message_list.html', {'messages': messages}, request)
+            render()  # préchauffage : compilation, lignes en cache
+            samples = []
+            for _ in range(args.repeat):
+                _, elapsed = timed(render)
+                samples.append(elapsed)
+        result = summarize(samples)
+        print(f"{name:>18} : p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Démarrage à froid : délai entre le lancement du conteneur (script de
+démarrage) et la première réponse 200 de ``/health/``.
+
+- ``avant`` : démarrage historique, ``makemigrations`` (ici ``--dry-run``,
+  pour ne rien écrire dans le projet), ``migrate``, ``collectstatic``
+  (répertoire vidé : conteneur neuf) et ``createsuperuser`` à chaque
+  démarrage, puis gunicorn sans préchargement ;
+- ``apres`` : ``build.sh``, migrations sous verrou (rien à appliquer) puis
+  gunicorn avec l'application préchargée dans le maître ;
+- ``apres_sans_release`` : ``build.sh`` avec ``RUN_RELEASE=0``, la release
+  ayant été faite à part.
+
+    cd messagerie
+    python -m benchmarks.coldstart --repeat 5 --workers 4
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import setup, summarize
+from benchmarks.loadtest import wait_until_ready
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BUILD_SCRIPT = BASE_DIR.parent / 'build.sh'
+
+LEGACY_STARTUP = (
+    "python manage.py makemigrations --dry-run"
+    " && python manage.py migrate --noinput"
+    " && python manage.py collectstatic --noinput"
+    " && (python manage.py createsuperuser --no-input || true)"
+    " && exec gunicorn -c gunicorn.conf.py messagerie.asgi:application"
+)
+
+PROFILES = {
+    'avant': (['sh', '-c', LEGACY_STARTUP], {'GUNICORN_RELOAD': '1'}),
+    'apres': (['sh', str(BUILD_SCRIPT)], {'RUN_RELEASE': '1'}),
+    'apres_sans_release': (['sh', str(BUILD_SCRIPT)], {'RUN_RELEASE': '0'}),
+}
+
+
+def cold_start(profile, port, workers, static_root):
+    command, env = PROFILES[profile]
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+           'GUNICORN_BIND': f'127.0.0.1:{port}', 'WEB_CONCURRENCY': str(workers),
+           'GUNICORN_RELOAD': '0', **env}
+    # Conteneur neuf : aucun fichier statique collecté
+    shutil.rmtree(static_root, ignore_errors=True)
+    start = time.perf_counter()
+    server = subprocess.Popen(command, cwd=BASE_DIR, env=env, start_new_session=True,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready('127.0.0.1', port, timeout=120)
+        return time.perf_counter() - start
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    # Base de benchmark migrée : seul le démarrage est mesuré
+    setup()
+    from django.conf import settings
+
+    print(f"{args.workers} workers, {args.repeat} démarrages par profil")
+    for profile in args.profiles:
+        samples = [cold_start(profile, args.port, args.workers, settings.STATIC_ROOT)
+                   for _ in range(args.repeat)]
+        result = summarize(samples)
+        print(f"{profile:>18} : p50 {result['p50_ms'] / 1000:6.2f} s  "
+              f"p95 {result['p95_ms'] / 1000:6.2f} s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
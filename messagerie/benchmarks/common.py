@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def setup():
+    """Initialise Django sur la base de benchmark et applique les migrations."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def timed(func, *args, **kwargs):
+    """Exécute ``func`` et renvoie ``(résultat, durée en secondes)``."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def seed_messages(users, messages, seed=42, batch_size=10000):
+    """Peuple la base de benchmark si elle ne contient pas déjà ``messages`` messages.
+
+    Même jeu que la commande ``seed_messages`` (voir ``mymessages.seeding``).
+    """
+    from mymessages import seeding
+
+    if not seeding.is_seeded(users, messages, seed):
+        seeding.seed(users, messages, seed=seed, batch_size=batch_size)
+
+
+def summarize(samples):
+    """p50 / p95 en millisecondes d'une liste de durées en secondes."""
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+    }
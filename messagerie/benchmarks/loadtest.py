@@ -0,0 +1,196 @@
+"""
+Test de charge des vues de lecture : requêtes/s et latence p50/p99.
+
+``--compare`` lance tour à tour les deux profils de serveur sur la base de
+benchmark, avec le même nombre de processus :
+
+- ``wsgi`` : configuration historique, gunicorn en workers synchrones et
+  vues synchrones (``MESSAGE_ASYNC_VIEWS=0``) ;
+- ``asgi`` : ``gunicorn.conf.py``, workers uvicorn et vues asynchrones.
+
+    cd messagerie
+    python -m benchmarks.loadtest --compare --concurrency 50 --duration 20
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --username u --password p
+"""
+
+import argparse
+import http.client
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+from benchmarks.common import percentile, seed_messages, setup
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+BENCH_USER = 'bench_0'
+BENCH_PASSWORD = 'bench-password'
+
+PROFILES = {
+    # gunicorn lit ./gunicorn.conf.py par défaut : on force les workers synchrones
+    'wsgi': (['gunicorn', '--worker-class', 'sync', 'messagerie.wsgi:application'],
+             {'MESSAGE_ASYNC_VIEWS': '0'}),
+    'asgi': (['gunicorn', '-c', 'gunicorn.conf.py', 'messagerie.asgi:application'],
+             {'MESSAGE_ASYNC_VIEWS': '1'}),
+}
+
+
+def login(host, port, username, password):
+    """Ouvre une session via le formulaire de connexion ; renvoie l'en-tête Cookie."""
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.request('GET', '/accounts/login/')
+    response = connection.getresponse()
+    page = response.read().decode()
+    csrf_cookie = re.search(r'csrftoken=([^;]+)', response.getheader('Set-Cookie', '')).group(1)
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+
+    body = urllib.parse.urlencode({
+        'username': username, 'password': password, 'csrfmiddlewaretoken': token})
+    connection.request('POST', '/accounts/login/', body, {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Cookie': f'csrftoken={csrf_cookie}',
+        'Referer': f'http://{host}:{port}/accounts/login/',
+    })
+    response = connection.getresponse()
+    response.read()
+    session = re.search(r'sessionid=([^;]+)', response.getheader('Set-Cookie', ''))
+    if session is None:
+        raise RuntimeError("Connexion refusée : vérifier l'utilisateur de test")
+    connection.close()
+    return f'sessionid={session.group(1)}'
+
+
+def run_load(host, port, paths, cookie, concurrency, duration):
+    """Enchaîne les requêtes sur ``paths`` avec ``concurrency`` clients."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        local, failed = [], 0
+        index = offset
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+
+def wait_until_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request('GET', '/health/')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Serveur indisponible sur {host}:{port}")
+
+
+def start_server(profile, port, workers):
+    command, env = PROFILES[profile]
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings',
+               WEB_CONCURRENCY=str(workers), GUNICORN_RELOAD='0', **env)
+    return subprocess.Popen(
+        command + ['--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                   '--log-level', 'warning', '--access-logfile', '/dev/null'],
+        cwd=BASE_DIR, env=env)
+
+
+def prepare_database(messages):
+    setup()
+    from django.contrib.auth.models import User
+    from mymessages.models import Message
+
+    seed_messages(100, messages)
+    user = User.objects.get(username=BENCH_USER)
+    user.set_password(BENCH_PASSWORD)
+    user.save(update_fields=['password'])
+    message_id = Message.objects.filter(owner=user).values_list('id', flat=True).first()
+    return ['/messages/', '/messages/?page=20', f'/messages/{message_id}/', '/health/']
+
+
+def print_result(name, result):
+    print(f"{name:>6} : {result['rps']:8.1f} req/s  p50 {result['p50_ms']:8.1f} ms  "
+          f"p99 {result['p99_ms']:8.1f} ms  ({result['requests']} requêtes, "
+          f"{result['errors']} erreurs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username', default=BENCH_USER)
+    parser.add_argument('--password', default=BENCH_PASSWORD)
+    parser.add_argument('--paths', nargs='+', default=['/messages/', '/health/'])
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    if not args.compare:
+        url = urllib.parse.urlsplit(args.url)
+        cookie = login(url.hostname, url.port, args.username, args.password)
+        print_result('serveur', run_load(url.hostname, url.port, args.paths, cookie,
+                                         args.concurrency, args.duration))
+        return
+
+    paths = prepare_database(args.messages)
+    print(f"{args.concurrency} clients, {args.duration:g} s, {args.workers} workers, "
+          f"{args.messages} messages")
+    for profile in PROFILES:
+        server = start_server(profile, args.port, args.workers)
+        try:
+            wait_until_ready('127.0.0.1', args.port)
+            cookie = login('127.0.0.1', args.port, BENCH_USER, BENCH_PASSWORD)
+            print_result(profile, run_load('127.0.0.1', args.port, paths, cookie,
+                                           args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
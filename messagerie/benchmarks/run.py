@@ -0,0 +1,223 @@
+"""
+Suite de benchmarks : scénarios chronométrés sur un jeu de données généré,
+résultats en JSON, et comparaison de deux exécutions.
+
+Les vues sont appelées de bout en bout (middlewares, templates) avec le
+client de test Django, sur la base de benchmark (SQLite par défaut, voir
+``benchmarks/settings.py``). Le jeu est celui de ``manage.py seed_messages``
+avec la même graine : deux exécutions mesurent les mêmes données.
+
+    cd messagerie
+    python -m benchmarks.run --messages 100000 --output avant.json
+    python -m benchmarks.run --messages 100000 --output apres.json
+    python -m benchmarks.run --compare avant.json apres.json --threshold 10
+    python -m benchmarks.run --scenarios import bulk_delete --import-rows 10000 100000 1000000
+
+``--compare`` affiche l'écart de p50 par scénario et sort en erreur (code 1)
+si l'un d'eux est plus lent de plus de ``--threshold`` %.
+"""
+
+import argparse
+import csv
+import io
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import seed_messages, setup, summarize, timed
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ('inbox', 'search', 'dashboard', 'export_pdf', 'stats_pdf', 'import', 'bulk_delete')
+
+# Super-utilisateur du tableau de bord, hors du préfixe bench_ du jeu généré
+ADMIN_USERNAME = 'benchadmin'
+
+
+def _get(client, url, **params):
+    response = client.get(url, params)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} : statut {response.status_code}")
+    # Une réponse en flux n'est produite qu'à la lecture
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def _repeat(func, repeat):
+    func()  # préchauffage : caches, plans de requête, imports
+    samples = []
+    for _ in range(repeat):
+        _, elapsed = timed(func)
+        samples.append(elapsed)
+    result = summarize(samples)
+    result['runs'] = repeat
+    return result
+
+
+def make_csv(rows, usernames):
+    """CSV au format de l'import, propriétaires et destinataires pris dans ``usernames``."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i in range(rows):
+        writer.writerow([f"Import de benchmark n°{i}", "2024-01-01 12:00:00",
+                         usernames[i % len(usernames)], usernames[(i + 7) % len(usernames)]])
+    return buffer.getvalue().encode('utf-8')
+
+
+def run_scenarios(names, args):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.files.base import ContentFile
+    from django.test import Client
+    from django.urls import reverse
+    from mymessages import deletion
+    from mymessages.models import Message
+    from mymessages.services import MessageImportService
+
+    # L'utilisateur le plus actif : le cas le plus coûteux
+    user = User.objects.get(username='bench_0')
+    client = Client()
+    client.force_login(user)
+    results = {}
+
+    if 'inbox' in names:
+        for page in (1, 100):
+            results[f'inbox_page_{page}'] = _repeat(
+                lambda: _get(client, reverse('message_list'), page=page), args.repeat)
+    if 'search' in names:
+        results['search'] = _repeat(
+            lambda: _get(client, reverse('message_list'), q='déploiement'), args.repeat)
+        results['search_author'] = _repeat(
+            lambda: _get(client, reverse('message_list'), q='bench_1'), args.repeat)
+    if 'dashboard' in names:
+        admin, _ = User.objects.get_or_create(
+            username=ADMIN_USERNAME, defaults={'is_superuser': True, 'is_staff': True})
+        admin_client = Client()
+        admin_client.force_login(admin)
+        results['dashboard_home'] = _repeat(
+            lambda: _get(admin_client, reverse('home')), args.repeat)
+    if 'export_pdf' in names:
+        results['export_messages_pdf'] = _repeat(
+            lambda: _get(client, reverse('export_messages_pdf')), args.pdf_repeat)
+    if 'stats_pdf' in names:
+        def cold_stats_pdf():
+            shutil.rmtree(settings.REPORT_CACHE_DIR, ignore_errors=True)
+            _get(client, reverse('export_stats_pdf'))
+        results['stats_pdf_cold'] = _repeat(cold_stats_pdf, args.pdf_repeat)
+        results['stats_pdf_cached'] = _repeat(
+            lambda: _get(client, reverse('export_stats_pdf')), args.repeat)
+
+    # Écritures : chaque import est supprimé ensuite, le jeu reste intact
+    if 'import' in names or 'bulk_delete' in names:
+        usernames = list(User.objects.filter(
+            username__startswith='bench_').order_by('id').values_list('username', flat=True)[:50])
+        for rows in args.import_rows:
+            content = make_csv(rows, usernames)
+            first_id = (Message.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+            (imported, _), elapsed = timed(
+                MessageImportService().import_csv, ContentFile(content))
+            if imported != rows:
+                raise RuntimeError(f"Import : {imported} lignes sur {rows}")
+            if 'import' in names:
+                results[f'import_{rows}'] = {
+                    'runs': 1, 'p50_ms': round(elapsed * 1000, 2),
+                    'p95_ms': round(elapsed * 1000, 2), 'rows_per_s': round(rows / elapsed)}
+            _, elapsed = timed(deletion.delete_messages, Message.objects.filter(id__gte=first_id))
+            if 'bulk_delete' in names:
+                results[f'bulk_delete_{rows}'] = {
+                    'runs': 1, 'p50_ms': round(elapsed * 1000, 2),
+                    'p95_ms': round(elapsed * 1000, 2), 'rows_per_s': round(rows / elapsed)}
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, new, threshold, min_ms):
+    """Écarts de p50 entre deux exécutions ; renvoie les scénarios en régression."""
+    regressions = []
+    print(f"{'scénario':<24} {'avant':>10} {'après':>10} {'écart':>8}")
+    for name in sorted(set(base['scenarios']) | set(new['scenarios'])):
+        before = base['scenarios'].get(name)
+        after = new['scenarios'].get(name)
+        if before is None or after is None:
+            print(f"{name:<24} {'absent avant' if before is None else 'absent après':>30}")
+            continue
+        change = (after['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+        # Un écart de quelques dixièmes de milliseconde n'est que du bruit
+        flagged = change > threshold and after['p50_ms'] - before['p50_ms'] >= min_ms
+        if flagged:
+            regressions.append(name)
+        print(f"{name:<24} {before['p50_ms']:8.1f}ms {after['p50_ms']:8.1f}ms "
+              f"{change:+7.1f}%{'  RÉGRESSION' if flagged else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--compare', nargs=2, metavar=('AVANT', 'APRES'))
+    parser.add_argument('--threshold', type=float, default=10,
+                        help="Régression au-delà de ce pourcentage de p50 (défaut 10).")
+    parser.add_argument('--min-ms', type=float, default=1,
+                        help="Écart absolu minimal pour signaler une régression.")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--pdf-repeat', type=int, default=3)
+    parser.add_argument('--import-rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--output', help="Fichier JSON des résultats (sinon la sortie standard).")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(base, new, args.threshold, args.min_ms) else 0
+
+    setup()
+    import django
+    from django.db import connection
+
+    seed_messages(args.users, args.messages, seed=args.seed)
+    started = time.time()
+    scenarios = run_scenarios(set(args.scenarios), args)
+    report = {
+        'meta': {
+            'started': started,
+            'duration_s': round(time.time() - started, 1),
+            'git': _git_commit(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'users': args.users,
+            'messages': args.messages,
+            'seed': args.seed,
+        },
+        'scenarios': scenarios,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        for name, result in scenarios.items():
+            print(f"{name:<24} p50 {result['p50_ms']:10.2f} ms  p95 {result['p95_ms']:10.2f} ms")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
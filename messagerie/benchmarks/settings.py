@@ -0,0 +1,26 @@
+"""
+Réglages des benchmarks : ceux du projet, sur une base dédiée.
+
+Par défaut une base SQLite locale (``benchmarks/bench.sqlite3``) ; définir
+``BENCH_DATABASE_URL`` pour mesurer sur PostgreSQL.
+"""
+
+from messagerie.settings import *  # noqa: F401,F403
+from messagerie.settings import BASE_DIR, SECRET_KEY
+import os
+import tempfile
+import dj_database_url
+
+SECRET_KEY = SECRET_KEY or 'benchmarks'
+DEBUG = False
+
+DATABASES = {
+    'default': dj_database_url.parse(os.environ.get(
+        'BENCH_DATABASE_URL',
+        f"sqlite:///{BASE_DIR / 'benchmarks' / 'bench.sqlite3'}")),
+}
+
+# Rapports PDF, métriques et fichiers statiques hors de l'arborescence du projet
+REPORT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'messagerie_bench_reports')
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'messagerie_bench_metrics')
+STATIC_ROOT = os.path.join(tempfile.gettempdir(), 'messagerie_bench_static')
@@ -0,0 +1,60 @@
+"""
+Profil de production gunicorn : l'application ASGI (``messagerie.asgi``)
+servie par des workers uvicorn.
+
+Chaque worker est une boucle d'événements : les vues asynchrones (liste,
+détail, santé, flux SSE) attendent la base ou le client sans bloquer le
+processus, la concurrence augmente sans ajouter de processus. Les vues
+synchrones restantes (PDF, import) passent dans le pool de threads de
+Django au lieu d'immobiliser un worker entier.
+
+    gunicorn -c gunicorn.conf.py messagerie.asgi:application
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+# Un worker asynchrone par cœur suffit : il sert de nombreuses requêtes à la fois
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# Les connexions SSE restent ouvertes : le timeout ne porte que sur le
+# battement de cœur du worker, pas sur la durée des requêtes.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Rechargement automatique réservé au développement
+reload = os.environ.get('GUNICORN_RELOAD', '0') == '1'
+
+# En production, Django est chargé une fois dans le maître : les workers
+# naissent par fork, prêts à servir, et partagent ces pages mémoire tant
+# qu'ils ne les modifient pas. Incompatible avec le rechargement.
+preload_app = not reload
+
+# Préchargés avec l'application (voir when_ready)
+WARM_TEMPLATES = ('base.html', 'message_list.html', 'message_row.html', 'message_detail.html')
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Exécuté dans le maître, avant le fork des workers
+    if not preload_app:
+        return
+    from django.db import connections
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns  # importe les URLconf et toutes les vues
+    for name in WARM_TEMPLATES:
+        get_template(name)  # compilés une fois, gardés par le chargeur en cache
+    # Une connexion ouverte ici serait partagée par tous les workers, et les
+    # threads d'un pool ne survivent pas au fork : chaque worker ouvre le sien
+    connections.close_all()
+    for db_connection in connections.all(initialized_only=True):
+        if hasattr(db_connection, 'close_pool'):
+            db_connection.close_pool()
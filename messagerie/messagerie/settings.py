@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 from pathlib import Path
 import dj_database_url
 
@@ -44,12 +46,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mymessages.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mymessages.middleware.ReplicaRoutingMiddleware',
+    'mymessages.middleware.RequestMetricsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,14 +63,18 @@ ROOT_URLCONF = 'messagerie.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Backend Django standard, chronométré par RequestMetricsMiddleware
+        'BACKEND': 'mymessages.instrumentation.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        # Sans 'loaders' explicites, Django enveloppe ces chargeurs dans le
+        # chargeur en cache : chaque template est compilé une fois par processus.
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'mymessages.context_processors.inbox_summary',
             ],
         },
     },
@@ -77,27 +86,141 @@ WSGI_APPLICATION = 'messagerie.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Vues de lecture (liste, détail) asynchrones : à garder sous ASGI
+# (gunicorn.conf.py) ; '0' pour les vues synchrones sous WSGI.
+MESSAGE_ASYNC_VIEWS = os.environ.get('MESSAGE_ASYNC_VIEWS', '1') == '1'
+
+# Pool de connexions de psycopg 3 dans chaque processus (PostgreSQL). Sous
+# ASGI, chaque requête exécute son code synchrone dans son propre thread :
+# sans pool, elle ouvrirait sa propre connexion (et sa négociation SSL). Le
+# pool la prête pour la requête et la reprend à la fin. Taille maximale par
+# processus : DATABASE_POOL_MAX_SIZE (10), à multiplier par WEB_CONCURRENCY
+# pour rester sous max_connections. DATABASE_POOL=0 revient aux connexions
+# directes.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '1') == '1'
+DATABASE_POOL_OPTIONS = {
+    'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+}
+
+# Sans pool, connexions persistantes selon le profil de serveur. Sous WSGI,
+# un thread par worker : la connexion sert requête après requête. Sous ASGI,
+# persistantes, les connexions par thread s'accumuleraient jusqu'à épuiser
+# max_connections. DATABASE_CONN_MAX_AGE force une valeur. Le pool exige 0.
+DATABASE_CONN_MAX_AGE = 0 if DATABASE_POOL else int(os.environ.get(
+    'DATABASE_CONN_MAX_AGE', 0 if MESSAGE_ASYNC_VIEWS else 600))
+
+
+def database_options(config):
+    """Ajoute le pool à ``config`` si c'est une base PostgreSQL."""
+    if DATABASE_POOL and config['ENGINE'] == 'django.db.backends.postgresql':
+        config.setdefault('OPTIONS', {})['pool'] = dict(DATABASE_POOL_OPTIONS)
+    return config
+
+
 if os.environ.get('DATABASE_URL'):
     # PRODUCTION (Render) :
     # Si la variable DATABASE_URL existe, on l'utilise directement.
     # ssl_require=True est recommandé pour la sécurité en prod.
     DATABASES = {
-        'default': dj_database_url.config(conn_max_age=600, ssl_require=True)
+        'default': database_options(
+            dj_database_url.config(conn_max_age=DATABASE_CONN_MAX_AGE, ssl_require=True))
     }
 else:
     # DEVELOPPEMENT (Local / Docker Compose) :
     # Sinon, on utilise les variables individuelles du fichier .env
     DATABASES = {
-        'default': {
+        'default': database_options({
             'ENGINE': 'django.db.backends.postgresql',
             'NAME': os.environ.get('POSTGRES_DB'),
             'USER': os.environ.get('POSTGRES_USER'),
             'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
             'HOST': os.environ.get('DB_HOST', 'localhost'),
             'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        })
+    }
+
+# Réplicas en lecture, séparés par des virgules : les vues de lecture
+# (liste, détail, tableau de bord, exports) y sont routées par
+# mymessages.routers.ReplicaRouter. Après une écriture, la session relit le
+# primaire pendant DATABASE_REPLICA_STICKY_SECONDS secondes.
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(
+        url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+        if url.strip()):
+    DATABASES[f'replica_{_index}'] = database_options(
+        dj_database_url.parse(_url, conn_max_age=DATABASE_CONN_MAX_AGE))
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+if sys.argv[1:2] == ['test'] and not DATABASE_REPLICAS:
+    # Tests : un second SQLite tient lieu de réplica, pour vérifier que les
+    # lectures y sont vraiment exécutées ; rien n'y est routé par défaut.
+    DATABASES['replica_0'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica_0.sqlite3',
+    }
+
+DATABASE_ROUTERS = ['mymessages.routers.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+# Cache (résumés de boîte) : mémoire locale par défaut, propre à chaque
+# processus, dont les invalidations ne sont donc pas vues des autres workers.
+# Avec plusieurs processus, CACHE_URL pointe vers un Redis partagé (redis://...).
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'messagerie',
         }
     }
 
+# Durée de vie (secondes) du HTML des lignes de message dans le cache
+# ci-dessus (templatetag message_rows) ; 0 pour tout rendre à chaque fois.
+MESSAGE_ROW_CACHE_TIMEOUT = int(os.environ.get('MESSAGE_ROW_CACHE_TIMEOUT', 3600))
+
+# Mesures par requête (en-tête Server-Timing + ligne de log JSON sur le
+# logger 'mymessages.requests'). Désactivées, le middleware est retiré de la
+# chaîne au démarrage. Au-delà d'un des seuils, la ligne passe en WARNING.
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', '0') == '1'
+REQUEST_METRICS_SLOW_MS = int(os.environ.get('REQUEST_METRICS_SLOW_MS', 500))
+REQUEST_METRICS_MAX_QUERIES = int(os.environ.get('REQUEST_METRICS_MAX_QUERIES', 20))
+
+# Métriques Prometheus (/metrics) : un fichier par processus dans
+# METRICS_DIR, additionnés à la lecture (voir mymessages/metrics.py).
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'messagerie_metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+# Accès à /metrics : en-tête « Authorization: Bearer <METRICS_TOKEN> » pour
+# le collecteur, ou session d'un membre du staff. Sans jeton, staff seulement.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'mymessages.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Backend d'import CSV : 'orm' (bulk_create) ou 'copy' (COPY PostgreSQL via
+# psycopg 3, repli automatique sur 'orm' avec les autres bases)
+MESSAGE_IMPORT_BACKEND = os.environ.get('MESSAGE_IMPORT_BACKEND', 'orm')
+
+# Backend de recherche des messages (chemin pointé d'une classe de
+# mymessages.search) ; par défaut choisi selon la base de données.
+MESSAGE_SEARCH_BACKEND = os.environ.get('MESSAGE_SEARCH_BACKEND')
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -140,6 +263,15 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# Fichiers téléversés (CSV en attente de traitement par le worker d'import)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# Rapports PDF de statistiques précalculés (voir mymessages/reports.py)
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR', os.path.join(MEDIA_ROOT, 'report_cache'))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+REPORT_CACHE_MAX_AGE = int(os.environ.get('REPORT_CACHE_MAX_AGE', 7 * 24 * 3600))
+
 # Authentification
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
@@ -16,16 +16,18 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from .views import health_check
+from .views import health_check, metrics_view
 from mymessages import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.home, name='home'),
+    path('feed/', views.home_feed, name='home_feed'),
     path('add/', views.add_message, name='add_message'),
     path('export-pdf/', views.export_messages_pdf, name='export_messages_pdf'),
     path('import/', views.import_messages, name='import_messages'),
     path('health/', health_check),
+    path('metrics', metrics_view, name='metrics'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('messages/', include('mymessages.urls')),
 ]
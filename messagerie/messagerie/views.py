@@ -1,11 +1,40 @@
+import hmac
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.http import HttpResponse
 from django.db import connection
+from mymessages import metrics
 
 
-def health_check(request):
+def _check_database():
+    # On tente une requête ultra-simple sur la base
+    connection.cursor()
+
+
+async def health_check(request):
+    # Asynchrone : la sonde ne bloque pas un worker ASGI pendant la connexion
     try:
-        # On tente une requête ultra-simple sur la base
-        connection.cursor()
+        await sync_to_async(_check_database)()
         return HttpResponse("OK", status=200)
     except Exception:
         return HttpResponse("Service Unavailable", status=503)
+
+
+def _can_read_metrics(request):
+    # Jeton du collecteur (Authorization: Bearer ...) ou session d'un membre du staff
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(
+            header.removeprefix('Bearer ').encode(), token.encode()):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics_view(request):
+    if not _can_read_metrics(request):
+        response = HttpResponse("Unauthorized", status=401)
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    # Format texte Prometheus
+    return HttpResponse(metrics.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,12 +1,30 @@
 from django.contrib import admin
-from .models import Message
+from . import stats
+from .models import ImportJob, Message
+from .pagination import EstimatedCountPaginator
 
 # Register your models here.
 
 
+class MessagePaginator(EstimatedCountPaginator):
+    def fallback_count(self):
+        # Hors PostgreSQL : total exact tenu par les compteurs matérialisés
+        return stats.total()
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('contenu', 'date_envoi', 'owner', 'recipient')
+    # Une jointure au lieu de deux requêtes par ligne
+    list_select_related = ('owner', 'recipient')
+    # Ordre de l'index (-date_envoi, -id) : pages et navigation par date indexées
+    ordering = ('-date_envoi', '-id')
+    date_hierarchy = 'date_envoi'
+    # Recherche d'utilisateur au lieu d'un <select> de tous les comptes
+    autocomplete_fields = ('owner', 'recipient')
+    paginator = MessagePaginator
+    # Pas de second COUNT(*) sur toute la table quand la liste est filtrée
+    show_full_result_count = False
 
     def get_readonly_fields(self, request, obj=None):
         if obj:  # Si l'objet existe (modification), on rend 'owner' non modifiable
@@ -18,3 +36,18 @@ class MessageAdmin(admin.ModelAdmin):
         if not getattr(obj, 'owner', None):
             obj.owner = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'owner', 'status', 'success_count', 'error_count', 'created', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('owner',)
+    actions = ['retry']
+
+    @admin.action(description="Relancer les imports en échec (reprise après la dernière ligne validée)")
+    def retry(self, request, queryset):
+        # Le CSV d'un job en échec est gardé : le worker reprend après last_line
+        count = queryset.filter(status=ImportJob.FAILED).update(
+            status=ImportJob.PENDING, finished_at=None)
+        self.message_user(request, f"{count} import(s) remis en file d'attente.")
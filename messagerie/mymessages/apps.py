@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MymessagesConfig(AppConfig):
     name = 'mymessages'
+
+    def ready(self):
+        # Branche les signaux qui tiennent à jour les statistiques et les métriques
+        from . import signals  # noqa: F401
@@ -0,0 +1,61 @@
+"""
+Recherche d'utilisateurs par préfixe pour les sélecteurs de destinataire.
+
+La recherche ignore la casse : la requête est un intervalle sur
+``UPPER(username)`` (``>= UPPER(préfixe)`` et ``< UPPER(préfixe) +
+U+10FFFF``), servi directement par l'index ``auth_user_username_upper_idx``
+(migration 0016), quel que soit le nombre de comptes, là où un ``LIKE
+'abc%'`` ne l'utilise pas sur PostgreSQL hors collation C. Les pages
+suivent l'ordre de l'index, ``UPPER(username)`` puis ``username``
+(``after`` = dernier nom reçu), sans OFFSET. Chaque page est gardée
+``AUTOCOMPLETE_TIMEOUT`` secondes dans le cache Django : un nouveau compte
+peut mettre ce temps à apparaître.
+"""
+
+import hashlib
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Upper
+
+PAGE_SIZE = 20
+AUTOCOMPLETE_TIMEOUT = 60
+
+# Plus grand point de code : borne haute de tous les noms commençant par le préfixe
+_MAX_CHAR = '\U0010ffff'
+
+
+def cache_key(prefix, after):
+    # Empreinte : un nom d'utilisateur peut contenir des caractères refusés par memcached
+    raw = f"{prefix}\x00{after}".encode()
+    return f"mymessages:user_autocomplete:{hashlib.sha256(raw).hexdigest()}"
+
+
+def search_users(prefix, after=None, limit=PAGE_SIZE):
+    """Renvoie ``{'results': [{'id', 'username'}], 'next': dernier nom ou None}``."""
+    key = cache_key(prefix, after)
+    page = cache.get(key)
+    if page is None:
+        page = _search(prefix, after, limit)
+        cache.set(key, page, AUTOCOMPLETE_TIMEOUT)
+    return page
+
+
+def _search(prefix, after, limit):
+    # Majuscules calculées par la base, comme dans l'index
+    users = User.objects.filter(is_active=True).alias(upper=Upper('username'))
+    if prefix:
+        upper_prefix = Upper(Value(prefix))
+        # L'intervalle utilise l'index ; istartswith garantit le préfixe exact
+        users = users.filter(upper__gte=upper_prefix,
+                             upper__lt=Concat(upper_prefix, Value(_MAX_CHAR)),
+                             username__istartswith=prefix)
+    if after:
+        upper_after = Upper(Value(after))
+        users = users.filter(Q(upper__gt=upper_after) | Q(upper=upper_after, username__gt=after))
+    # Un de plus pour savoir s'il reste une page
+    rows = list(users.order_by('upper', 'username').values('id', 'username')[:limit + 1])
+    return {
+        'results': rows[:limit],
+        'next': rows[limit - 1]['username'] if len(rows) > limit else None,
+    }
@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+from . import summary
+
+
+def inbox_summary(request):
+    """Expose ``inbox_summary`` (reçus, envoyés, dernier message) aux gabarits.
+
+    Paresseux : rien n'est lu, ni dans le cache ni en base, si le gabarit
+    n'utilise pas la variable.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'inbox_summary': SimpleLazyObject(lambda: summary.get_summary(user))}
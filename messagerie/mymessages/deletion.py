@@ -0,0 +1,69 @@
+"""
+Suppression de messages en masse, par lots bornés.
+
+``QuerySet.delete()`` charge tous les objets pour gérer les cascades et
+émettre les signaux, et un ``id__in`` de plusieurs dizaines de milliers
+d'identifiants dépasse la limite de paramètres de certaines bases. Ici, on
+lit les clés du lot (identifiant, date, propriétaire, destinataire, sans le
+contenu), on supprime le lot par un ``DELETE`` direct, puis on met à jour
+les compteurs (``stats``) et les résumés de boîte (``summary``) dans la même
+transaction. L'index plein texte SQLite suit par ses triggers.
+
+Si un modèle référence un jour ``Message`` (cascade à appliquer), on se
+replie sur ``delete()`` lot par lot : les signaux tiennent alors les
+compteurs à jour.
+"""
+
+from types import SimpleNamespace
+from django.db import router, transaction
+from . import stats, summary
+from .models import Message
+
+CHUNK_SIZE = 1000
+
+
+def can_raw_delete():
+    """Vrai si aucune relation ne pointe vers ``Message``."""
+    opts = Message._meta
+    return not opts.related_objects and not opts.private_fields
+
+
+def delete_messages(queryset, chunk_size=CHUNK_SIZE):
+    """Supprime les messages de ``queryset`` par lots ; renvoie leur nombre.
+
+    ``queryset`` peut être un filtre quelconque (recherche comprise) : il est
+    réévalué à chaque lot.
+    """
+    using = router.db_for_write(Message)
+    raw = can_raw_delete()
+    deleted = 0
+    # Lots pris par date décroissante (index *_date_id) : chaque lot touche
+    # peu de jours, donc peu de compteurs journaliers à mettre à jour. Les
+    # lignes supprimées disparaissent du filtre : pas besoin de curseur.
+    queryset = queryset.order_by('-date_envoi', '-id')
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(queryset.values_list(
+                'pk', 'date_envoi', 'owner_id', 'recipient_id')[:chunk_size])
+            if not rows:
+                return deleted
+            deleted += _delete_chunk(rows, raw, using)
+
+
+def _delete_chunk(rows, raw, using):
+    ids = [row[0] for row in rows]
+    chunk = Message.objects.using(using).filter(pk__in=ids)
+    if not raw:
+        count, _ = chunk.delete()
+        return count
+
+    count = chunk._raw_delete(using)
+    # Les clés lues avant le DELETE suffisent aux compteurs : pas de signal
+    # à émettre ni d'objet à instancier.
+    messages = [SimpleNamespace(date_envoi=date_envoi, owner_id=owner_id,
+                                recipient_id=recipient_id)
+                for _, date_envoi, owner_id, recipient_id in rows]
+    with stats.batch(), summary.batch():
+        stats.record(messages, delta=-1)
+        summary.invalidate(messages)
+    return count
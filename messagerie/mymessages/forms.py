@@ -0,0 +1,35 @@
+from django import forms
+from django.contrib.auth.models import User
+from django.urls import reverse_lazy
+from .models import Message
+
+
+class UserAutocompleteWidget(forms.Select):
+    """Liste déroulante d'utilisateurs alimentée par ``user_autocomplete``.
+
+    Seule l'option sélectionnée est rendue côté serveur (une requête par
+    clé primaire) ; les autres arrivent par l'API au fil de la saisie.
+    """
+
+    template_name = 'widgets/user_autocomplete.html'
+
+    class Media:
+        js = ('js/user_autocomplete.js',)
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        self.attrs.setdefault('data-autocomplete-url', reverse_lazy('user_autocomplete'))
+
+    def get_context(self, name, value, attrs):
+        selected = [pk for pk in self.format_value(value) if pk.isdigit()]
+        # Remplace le ModelChoiceIterator du champ, qui lirait toute la table
+        self.choices = [('', '---------')] + list(
+            User.objects.filter(pk__in=selected).values_list('pk', 'username'))
+        return super().get_context(name, value, attrs)
+
+
+class MessageForm(forms.ModelForm):
+    class Meta:
+        model = Message
+        fields = ['contenu', 'recipient']
+        widgets = {'recipient': UserAutocompleteWidget}
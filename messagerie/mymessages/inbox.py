@@ -0,0 +1,71 @@
+import heapq
+from .models import Message
+
+
+class InboxQuery:
+    """Messages envoyés ou reçus par ``user``, paginables comme un QuerySet.
+
+    ``filter(Q(owner=user) | Q(recipient=user))`` ne peut pas être servi par
+    un seul index : la base lit toute la boîte puis la trie. Ici, une page
+    fusionne deux sous-requêtes déjà triées par leur index, ``owner=user``
+    (index owner, -date_envoi, -id) et ``recipient=user`` hors messages à
+    soi-même (index recipient, -date_envoi, -id), chacune limitée à la fenêtre
+    de la page. Les deux ensembles sont disjoints : ni DISTINCT ni dédoublonnage.
+    """
+
+    model = Message
+
+    def __init__(self, user, queryset=None, descending=True):
+        queryset = Message.objects.all() if queryset is None else queryset
+        self.descending = descending
+        self.ordering = ('-date_envoi', '-id') if descending else ('date_envoi', 'id')
+        self.sent = queryset.filter(owner=user).order_by(*self.ordering)
+        self.received = queryset.filter(recipient=user).exclude(
+            owner=user).order_by(*self.ordering)
+
+    # Le Paginator utilise count() et le découpage par tranche
+    ordered = True
+
+    def count(self):
+        return self.sent.count() + self.received.count()
+
+    async def acount(self):
+        return await self.sent.acount() + await self.received.acount()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, item.stop
+        ids = self._page_ids(self._merge(
+            self.sent.values_list('date_envoi', 'id')[:stop],
+            self.received.values_list('date_envoi', 'id')[:stop]), start, stop)
+        return self._fetch(ids)
+
+    async def aslice(self, start, stop):
+        """Équivalent asynchrone de ``self[start:stop]`` (ORM asynchrone)."""
+        sent = [key async for key in self.sent.values_list('date_envoi', 'id')[:stop]]
+        received = [key async for key in
+                    self.received.values_list('date_envoi', 'id')[:stop]]
+        ids = self._page_ids(self._merge(sent, received), start, stop)
+        return self._ordered(ids, await self._rows(ids).ain_bulk())
+
+    def _merge(self, *key_lists):
+        return heapq.merge(*key_lists, reverse=self.descending)
+
+    @staticmethod
+    def _page_ids(keys, start, stop):
+        return [pk for _, pk in list(keys)[start:stop]]
+
+    def _fetch(self, ids):
+        return self._ordered(ids, self._rows(ids).in_bulk())
+
+    @staticmethod
+    def _rows(ids):
+        return Message.objects.filter(id__in=ids).select_related('owner', 'recipient')
+
+    @staticmethod
+    def _ordered(ids, messages):
+        return [messages[pk] for pk in ids if pk in messages]
@@ -0,0 +1,83 @@
+"""
+Mesures par requête : nombre et durée des requêtes SQL, durée du rendu des
+templates, taille de la réponse.
+
+``RequestMetricsMiddleware`` ouvre un ``RequestMetrics`` pour la requête ;
+les requêtes SQL sont comptées par ``record_query``, posé sur chaque
+connexion à son ouverture (``signals``), et les rendus par le backend de
+templates ``DjangoTemplates`` de ce module (à déclarer dans ``TEMPLATES``).
+Hors requête mesurée, l'un et l'autre se contentent de lire une ContextVar.
+"""
+
+import time
+from contextvars import ContextVar
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.template.backends.django import reraise
+
+# Mesures de la requête en cours ; un objet mutable, modifié depuis le
+# thread des vues synchrones comme depuis la boucle asynchrone.
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def record_query(execute, sql, params, many, context):
+    """``execute_wrapper`` de chaque connexion : compte pour la requête en cours."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+def start():
+    """Ouvre les mesures d'une requête ; renvoie ``(mesures, jeton)``."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end(token):
+    _current.reset(token)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Backend Django standard dont les rendus sont chronométrés."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,139 @@
+import datetime
+import io
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ImportChunk, ImportJob
+from .services import MessageImportService
+
+# Nombre de lignes rejetées conservées sur le job pour l'affichage
+MAX_STORED_ERRORS = 100
+
+# Un job « en cours » sans signe de vie depuis ce délai (secondes) a perdu
+# son worker (arrêt, crash) : il est repris par un autre
+STALE_JOB_TIMEOUT = 600
+
+# Taille des morceaux du CSV gardés en base (ImportChunk)
+CSV_CHUNK_SIZE = 1024 * 1024
+
+
+def create_job(owner, uploaded_file):
+    """Met en file l'import de ``uploaded_file`` ; renvoie l'``ImportJob``.
+
+    Le CSV est copié en base morceau par morceau, dans la transaction qui
+    crée le job : aucun worker ne le voit avant qu'il soit complet.
+    """
+    with transaction.atomic():
+        job = ImportJob.objects.create(owner=owner)
+        for index, data in enumerate(uploaded_file.chunks(CSV_CHUNK_SIZE)):
+            ImportChunk.objects.create(job=job, index=index, data=data)
+    return job
+
+
+class ChunkReader(io.RawIOBase):
+    """Lecture en flux du CSV d'un job : un seul morceau en mémoire à la fois."""
+
+    def __init__(self, job):
+        self.job = job
+        self.index = 0
+        self.data = b''
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.offset >= len(self.data):
+            data = (ImportChunk.objects.filter(job=self.job, index=self.index)
+                    .values_list('data', flat=True).first())
+            if data is None:
+                return 0
+            self.data, self.offset = bytes(data), 0
+            self.index += 1
+        size = min(len(buffer), len(self.data) - self.offset)
+        buffer[:size] = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+
+def open_csv(job):
+    """Fichier binaire du CSV de ``job``, à utiliser comme gestionnaire de contexte."""
+    if job.csv_file:
+        return job.csv_file.open('rb')
+    return io.BufferedReader(ChunkReader(job), CSV_CHUNK_SIZE)
+
+
+def discard_csv(job):
+    job.chunks.all().delete()
+    if job.csv_file:
+        job.csv_file.delete(save=False)
+
+
+def claim_next_job():
+    """Réserve le plus ancien job en attente ou abandonné, ou renvoie None.
+
+    La base sert de file d'attente : ``SELECT ... FOR UPDATE SKIP LOCKED``
+    permet à plusieurs workers de dépiler en parallèle sans se bloquer ni
+    traiter deux fois le même job. Un job en cours dont le worker ne donne
+    plus signe de vie depuis ``STALE_JOB_TIMEOUT`` est repris là où il
+    s'était arrêté.
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=STALE_JOB_TIMEOUT)
+    with transaction.atomic():
+        job = (ImportJob.objects.select_for_update(skip_locked=True)
+               .filter(Q(status=ImportJob.PENDING)
+                       | Q(status=ImportJob.RUNNING, heartbeat__lt=stale))
+               .order_by('created', 'id')
+               .first())
+        if job is None:
+            return None
+        job.status = ImportJob.RUNNING
+        job.started_at = job.started_at or now
+        job.heartbeat = now
+        job.save(update_fields=['status', 'started_at', 'heartbeat'])
+    return job
+
+
+def run_job(job):
+    # Job repris : compteurs et rejets des lots déjà validés par le worker précédent
+    base_success, base_errors = job.success_count, job.error_count
+    stored_errors = list(job.errors)
+    service = MessageImportService(max_errors=max(0, MAX_STORED_ERRORS - len(stored_errors)))
+
+    def progress(success_count, error_count, last_line):
+        # Dans la transaction du lot : la progression enregistrée est celle des lots validés
+        job.success_count = base_success + success_count
+        job.error_count = base_errors + error_count
+        job.errors = stored_errors + [list(error) for error in service.errors]
+        job.last_line = last_line
+        job.heartbeat = timezone.now()
+        job.save(update_fields=['success_count', 'error_count', 'errors', 'last_line', 'heartbeat'])
+
+    try:
+        with open_csv(job) as csv_file:
+            service.import_csv(csv_file, progress=progress, start_after=job.last_line)
+    except Exception as exc:
+        job.status = ImportJob.FAILED
+        # Après les rejets des lots validés ; le fichier est gardé pour une
+        # reprise après last_line (action « Relancer » de l'admin)
+        job.errors = job.errors + [[None, str(exc)]]
+    else:
+        job.status = ImportJob.DONE
+
+    # Compteurs et rejets déjà enregistrés lot par lot : pas d'écrasement ici
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'errors', 'finished_at'])
+    if job.status == ImportJob.DONE:
+        # Le fichier n'est plus utile une fois l'import terminé
+        discard_csv(job)
+    return job
+
+
+def process_pending_jobs():
+    """Traite les jobs en attente jusqu'à ce que la file soit vide."""
+    processed = 0
+    while (job := claim_next_job()) is not None:
+        run_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+# Clé du verrou consultatif PostgreSQL, propre à cette commande
+LOCK_KEY = 7_310_542_601
+
+
+class Command(BaseCommand):
+    help = ("Applique les migrations en attente, un seul processus à la fois "
+            "(verrou consultatif sur PostgreSQL). À lancer une fois par release : "
+            "les suivants attendent le verrou puis ne trouvent plus rien à faire.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--lock-timeout', type=float, default=300,
+                            help="Attente maximale du verrou, en secondes.")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with self._lock(connection, options['lock_timeout']):
+            executor = MigrationExecutor(connection)
+            if not executor.migration_plan(executor.loader.graph.leaf_nodes()):
+                self.stdout.write("Aucune migration à appliquer.")
+                return
+            call_command('migrate', database=options['database'], interactive=False,
+                         verbosity=options['verbosity'], stdout=self.stdout)
+
+    @contextmanager
+    def _lock(self, connection, timeout):
+        if connection.vendor != 'postgresql':
+            # SQLite : base locale, un seul serveur
+            yield
+            return
+        # Verrou de session : migrate réutilise la même connexion
+        deadline = time.monotonic() + timeout
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [LOCK_KEY])
+            while not cursor.fetchone()[0]:
+                if time.monotonic() > deadline:
+                    raise CommandError(f"Verrou des migrations non obtenu en {timeout:g} s.")
+                time.sleep(1)
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [LOCK_KEY])
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [LOCK_KEY])
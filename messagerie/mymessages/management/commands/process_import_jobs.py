@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from mymessages.jobs import process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Worker des imports CSV : dépile les ImportJob en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Vide la file puis s'arrête au lieu d'attendre de nouveaux jobs.")
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help="Secondes d'attente entre deux scrutations de la file vide.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_jobs()
+            if processed:
+                self.stdout.write(f"{processed} import(s) traité(s).")
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from mymessages import stats
+from mymessages.models import DailyMessageStat, OwnerMessageStat
+
+
+class Command(BaseCommand):
+    help = "Recalcule entièrement les statistiques matérialisées des messages."
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        self.stdout.write(
+            f"Statistiques reconstruites : {DailyMessageStat.objects.count()} jour(s), "
+            f"{OwnerMessageStat.objects.count()} propriétaire(s).")
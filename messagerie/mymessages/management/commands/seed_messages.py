@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from mymessages import seeding
+
+
+class Command(BaseCommand):
+    help = ("Remplace les messages par un jeu synthétique reproductible "
+            "(benchmarks, essais de charge). Ne pas lancer en production.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--messages', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--force', action='store_true',
+                            help="Regénère même si la base contient déjà ce jeu, "
+                                 "quitte à supprimer des messages hors du jeu.")
+
+    def handle(self, *args, **options):
+        users, messages = options['users'], options['messages']
+        if not options['force'] and seeding.is_seeded(users, messages, options['seed']):
+            self.stdout.write(f"Jeu déjà en place : {messages} messages, {users} utilisateurs.")
+            return
+        try:
+            seeding.seed(users, messages, seed=options['seed'],
+                         batch_size=options['batch_size'], force=options['force'])
+        except ValueError as exc:
+            raise CommandError(f"{exc} : --force pour les supprimer.") from exc
+        self.stdout.write(f"Jeu généré : {messages} messages, {users} utilisateurs.")
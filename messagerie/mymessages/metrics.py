@@ -0,0 +1,245 @@
+"""
+Métriques au format texte Prometheus, sans service externe.
+
+Chaque processus (worker gunicorn, worker d'import) compte en mémoire puis
+écrit ses valeurs dans son propre fichier ``<METRICS_DIR>/<hôte>-<pid>.json``,
+au plus toutes les ``METRICS_FLUSH_SECONDS`` secondes et à la sortie ;
+l'écriture se fait dans un thread, hors du chemin des requêtes. Aucun
+fichier n'est partagé en écriture : la vue ``/metrics`` additionne les
+fichiers de tous les processus au moment de la lecture. Un processus qui
+réutilise l'hôte et le pid d'un ancien reprend ses compteurs, qui ne
+redescendent donc pas ; vider ``METRICS_DIR`` au déploiement remet tout à zéro.
+"""
+
+import atexit
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bornes des histogrammes de durée, en secondes
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Aide affichée par /metrics ; les métriques absentes d'ici restent exportées
+HELP = {
+    'messagerie_requests_total': ('counter', "Requêtes HTTP par vue et statut"),
+    'messagerie_request_duration_seconds': ('histogram', "Durée des requêtes HTTP par vue"),
+    'messagerie_db_connections_opened_total': (
+        'counter', "Connexions ouvertes (peu de connexions pour beaucoup de requêtes = réutilisation)"),
+    'messagerie_import_rows_total': ('counter', "Lignes CSV importées, par résultat"),
+    'messagerie_import_seconds_total': ('counter', "Temps passé à importer (lignes/s = rows / seconds)"),
+    'messagerie_pdf_render_seconds': ('histogram', "Durée de génération des PDF"),
+    'messagerie_cache_requests_total': ('counter', "Consultations de cache, par résultat"),
+}
+
+
+class Registry:
+    """Compteurs et histogrammes du processus, protégés par un verrou local."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Une seule écriture de fichier à la fois, sans bloquer les compteurs
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._dirty = False
+        self._flushing = False
+        self._last_flush = 0.0
+        self.counters = {}
+        self.histograms = {}
+
+    def _check_process(self):
+        # Après un fork (gunicorn --preload), repartir du fichier du nouveau pid
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._flushing = False
+            self.counters, self.histograms = {}, {}
+            self._load(_path(pid))
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.counters = data.get('counters', {})
+        self.histograms = data.get('histograms', {})
+
+    def inc(self, name, labels=None, value=1):
+        key = _label_key(labels)
+        with self._lock:
+            self._check_process()
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            self._dirty = True
+            due = self._flush_due()
+        if due:
+            self._start_flush()
+
+    def observe(self, name, value, labels=None):
+        key = _label_key(labels)
+        with self._lock:
+            self._check_process()
+            series = self.histograms.setdefault(name, {})
+            histogram = series.setdefault(
+                key, {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0, 'count': 0})
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+            self._dirty = True
+            due = self._flush_due()
+        if due:
+            self._start_flush()
+
+    def _flush_due(self):
+        # Appelé sous le verrou : un seul thread d'écriture à la fois
+        if self._flushing or time.monotonic() - self._last_flush < settings.METRICS_FLUSH_SECONDS:
+            return False
+        self._flushing = True
+        return True
+
+    def _start_flush(self):
+        # La requête (ou la boucle ASGI) n'attend pas le disque
+        threading.Thread(target=self._background_flush, daemon=True).start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        except OSError:
+            logger.exception("Écriture des métriques impossible")
+        finally:
+            self._flushing = False
+
+    def flush(self):
+        """Écrit les valeurs du processus dans son fichier (écriture atomique)."""
+        # Sous _flush_lock : deux écritures concurrentes ne s'inversent pas
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._check_process()
+                self._dirty = False
+                self._last_flush = time.monotonic()
+                # Copie sous le verrou, écriture hors du verrou des compteurs
+                data = json.dumps({'counters': self.counters, 'histograms': self.histograms})
+                path = _path(self._pid)
+            directory = settings.METRICS_DIR
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def _path(pid):
+    # Le nom d'hôte distingue les conteneurs qui partagent le répertoire
+    return os.path.join(settings.METRICS_DIR, f"{socket.gethostname()}-{pid}.json")
+
+
+def _label_key(labels):
+    # Clé JSON stable : les étiquettes triées, au format Prometheus
+    if not labels:
+        return ''
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def inc(name, labels=None, value=1):
+    registry.inc(name, labels, value)
+
+
+def observe(name, value, labels=None):
+    registry.observe(name, value, labels)
+
+
+class timer:
+    """Mesure la durée d'un bloc dans l'histogramme ``name``."""
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.start, self.labels)
+
+
+def collect():
+    """Additionne les fichiers de tous les processus ; renvoie ``(compteurs, histogrammes)``."""
+    registry.flush()
+    counters, histograms = {}, {}
+    try:
+        names = os.listdir(settings.METRICS_DIR)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, name)) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        for metric, series in data.get('counters', {}).items():
+            merged = counters.setdefault(metric, {})
+            for key, value in series.items():
+                merged[key] = merged.get(key, 0) + value
+        for metric, series in data.get('histograms', {}).items():
+            merged = histograms.setdefault(metric, {})
+            for key, histogram in series.items():
+                total = merged.setdefault(
+                    key, {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+                total['sum'] += histogram['sum']
+                total['count'] += histogram['count']
+    return counters, histograms
+
+
+def _series(name, key, extra=''):
+    labels = ','.join(part for part in (key, extra) if part)
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def render():
+    """Toutes les métriques au format texte d'exposition Prometheus."""
+    counters, histograms = collect()
+    lines = []
+
+    def header(name, default_type):
+        kind, text = HELP.get(name, (default_type, name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for name in sorted(counters):
+        header(name, 'counter')
+        for key, value in sorted(counters[name].items()):
+            lines.append(f"{_series(name, key)} {value}")
+    for name in sorted(histograms):
+        header(name, 'histogram')
+        for key, histogram in sorted(histograms[name].items()):
+            for bound, count in zip(DURATION_BUCKETS, histogram['buckets']):
+                le = _label_key({'le': bound})
+                lines.append(f"{_series(name + '_bucket', key, le)} {count}")
+            le = _label_key({'le': '+Inf'})
+            lines.append(f"{_series(name + '_bucket', key, le)} {histogram['count']}")
+            lines.append(f"{_series(name + '_sum', key)} {histogram['sum']}")
+            lines.append(f"{_series(name + '_count', key)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,185 @@
+import json
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from . import instrumentation, metrics, routers
+
+request_logger = logging.getLogger('mymessages.requests')
+
+# Clé de session : instant jusqu'auquel la session lit le primaire
+REPLICA_PIN_SESSION_KEY = '_replica_pinned_until'
+
+
+class ReplicaRoutingMiddleware:
+    """Choisit primaire ou réplica pour chaque requête (voir ``routers``).
+
+    À placer après ``SessionMiddleware`` : l'épinglage après écriture est
+    enregistré dans la session avant qu'elle ne soit sauvegardée.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Sous ASGI, rester asynchrone : pas de passage forcé par un thread
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request(token)
+        if self._pins_primary(request):
+            request.session[REPLICA_PIN_SESSION_KEY] = self._pin_until()
+        return response
+
+    async def __acall__(self, request):
+        token = routers.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.end_request(token)
+        if self._pins_primary(request):
+            await request.session.aset(REPLICA_PIN_SESSION_KEY, self._pin_until())
+        return response
+
+    @staticmethod
+    def _pins_primary(request):
+        # Lire ses propres écritures : primaire pour les prochaines requêtes
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') and hasattr(request, 'session')
+
+    @staticmethod
+    def _pin_until():
+        return time.time() + settings.DATABASE_REPLICA_STICKY_SECONDS
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        view_class = getattr(view_func, 'view_class', None)
+        if not (getattr(view_func, 'use_replica', False)
+                or getattr(view_class, 'use_replica', False)):
+            return None
+        session = getattr(request, 'session', None)
+        if session is not None and session.get(REPLICA_PIN_SESSION_KEY, 0) > time.time():
+            return None
+        routers.use_replica()
+        return None
+
+
+class RequestMetricsMiddleware:
+    """Mesure chaque requête (voir ``instrumentation``) si ``REQUEST_METRICS_ENABLED``.
+
+    Les mesures partent dans l'en-tête ``Server-Timing`` (visible dans les
+    outils du navigateur) et dans une ligne JSON sur ``mymessages.requests``,
+    en WARNING au-delà de ``REQUEST_METRICS_SLOW_MS`` ou de
+    ``REQUEST_METRICS_MAX_QUERIES``. Les requêtes SQL de toutes les bases,
+    réplicas compris, sont comptées, même depuis le thread d'une vue
+    synchrone servie en ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            # Retiré de la chaîne : aucun coût par requête
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = instrumentation.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.end(token)
+        self._report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token = instrumentation.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.end(token)
+        self._report(request, response, metrics)
+        return response
+
+    @staticmethod
+    def _report(request, response, metrics):
+        elapsed_ms = metrics.elapsed * 1000
+        sql_ms = metrics.sql_time * 1000
+        template_ms = metrics.template_time * 1000
+        response['Server-Timing'] = (
+            f'db;dur={sql_ms:.1f};desc="{metrics.queries} queries", '
+            f'tpl;dur={template_ms:.1f}, total;dur={elapsed_ms:.1f}')
+
+        flagged = (elapsed_ms > settings.REQUEST_METRICS_SLOW_MS
+                   or metrics.queries > settings.REQUEST_METRICS_MAX_QUERIES)
+        match = request.resolver_match
+        request_logger.log(logging.WARNING if flagged else logging.INFO, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(elapsed_ms, 1),
+            'queries': metrics.queries,
+            'sql_ms': round(sql_ms, 1),
+            'template_ms': round(template_ms, 1),
+            # Taille inconnue d'une réponse en flux avant son envoi
+            'size': None if response.streaming else len(response.content),
+            'flagged': flagged,
+        }))
+
+
+class MetricsMiddleware:
+    """Compte les requêtes et mesure leur durée par nom d'URL (voir ``metrics``).
+
+    À placer en tête de ``MIDDLEWARE`` : la durée couvre toute la chaîne.
+    Retiré de la chaîne si ``METRICS_ENABLED`` est faux.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        # Aucune attente sur le disque : le fichier est écrit par un thread
+        self._observe(request, response, start)
+        return response
+
+    @staticmethod
+    def _observe(request, response, start):
+        match = request.resolver_match
+        # Le nom d'URL, ou son motif, plutôt que le chemin : un nombre de séries borné
+        view = (match.view_name or match.route or 'unnamed') if match else 'unresolved'
+        metrics.observe('messagerie_request_duration_seconds',
+                        time.perf_counter() - start, {'view': view})
+        metrics.inc('messagerie_requests_total',
+                    {'view': view, 'status': response.status_code})
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 20:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_stats(apps, schema_editor):
+    # Calcul initial des compteurs à partir des messages existants
+    Message = apps.get_model('mymessages', 'Message')
+    DailyMessageStat = apps.get_model('mymessages', 'DailyMessageStat')
+    OwnerMessageStat = apps.get_model('mymessages', 'OwnerMessageStat')
+
+    daily = Message.objects.annotate(day=TruncDate('date_envoi')).values(
+        'day').annotate(count=Count('id')).order_by()
+    DailyMessageStat.objects.bulk_create(
+        DailyMessageStat(day=row['day'], count=row['count']) for row in daily)
+
+    owners = Message.objects.values('owner_id').annotate(
+        count=Count('id')).order_by()
+    OwnerMessageStat.objects.bulk_create(
+        OwnerMessageStat(owner_id=row['owner_id'], count=row['count']) for row in owners)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0005_importjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMessageStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OwnerMessageStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='message_stat', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 20:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0006_message_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Les index composites sont créés avant de retirer les index simples
+    # sur owner_id et recipient_id qu'ils remplacent.
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['owner', '-date_envoi'], name='message_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', '-date_envoi'], name='message_recipient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['-date_envoi', '-id'], name='message_date_id_idx'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='recipient',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='received_messages', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
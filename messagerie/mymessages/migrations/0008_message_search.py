@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 20:15
+
+from django.db import migrations
+from mymessages.search import FTS_TABLE, POSTGRES_SEARCH_SQL, SQLITE_FTS_SQL
+
+
+def create_search_index(apps, schema_editor):
+    statements = {
+        'postgresql': POSTGRES_SEARCH_SQL,
+        'sqlite': SQLITE_FTS_SQL,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS message_search_vector_idx")
+        schema_editor.execute(
+            "ALTER TABLE mymessages_message DROP COLUMN IF EXISTS search_vector")
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0007_message_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 20:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0008_message_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Les nouveaux index (avec id pour départager les dates égales)
+        # sont créés avant de supprimer ceux qu'ils remplacent.
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['owner', '-date_envoi', '-id'], name='message_owner_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', '-date_envoi', '-id'], name='message_recipient_date_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_owner_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_recipient_date_idx',
+        ),
+    ]
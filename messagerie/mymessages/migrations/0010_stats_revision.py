@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0009_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 21:24
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+from mymessages.search import SQLITE_FTS_SQL
+
+
+def create_sqlite_fts_triggers(apps, schema_editor):
+    # SQLite ajoute la colonne en recréant la table : ses triggers FTS
+    # disparaissent avec l'ancienne table.
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_FTS_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0010_stats_revision'),
+    ]
+
+    operations = [
+        # Retour arrière : la suppression de la colonne recrée aussi la table
+        migrations.RunPython(migrations.RunPython.noop, create_sqlite_fts_triggers),
+        migrations.AddField(
+            model_name='message',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.RunPython(create_sqlite_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 21:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0011_message_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='last_line',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-19 10:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('mymessages', '0015_seedmarker'),
+    ]
+
+    operations = [
+        # Autocomplétion insensible à la casse (mymessages.autocomplete) :
+        # intervalle et tri sur UPPER(username), départagés par username
+        migrations.RunSQL(
+            "CREATE INDEX auth_user_username_upper_idx ON auth_user (UPPER(username), username)",
+            "DROP INDEX auth_user_username_upper_idx",
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-19 10:50
+
+from django.db import migrations
+from mymessages.search import POSTGRES_SEARCH_SQL
+
+
+def drop_search_vector(schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS message_search_vector_idx")
+    schema_editor.execute("ALTER TABLE mymessages_message DROP COLUMN IF EXISTS search_vector")
+
+
+def unaccent_search_vector(apps, schema_editor):
+    # Colonne générée : son expression ne change qu'en la recréant
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    drop_search_vector(schema_editor)
+    for statement in POSTGRES_SEARCH_SQL:
+        schema_editor.execute(statement)
+
+
+def restore_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    drop_search_vector(schema_editor)
+    schema_editor.execute("DROP FUNCTION IF EXISTS mymessages_unaccent(text)")
+    schema_editor.execute(
+        "ALTER TABLE mymessages_message ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(contenu, ''))) STORED")
+    schema_editor.execute(
+        "CREATE INDEX message_search_vector_idx ON mymessages_message USING gin (search_vector)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mymessages', '0016_user_username_upper_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(unaccent_search_vector, restore_search_vector),
+    ]
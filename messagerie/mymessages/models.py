@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Now
 from django.urls import reverse
 from django.utils import timezone
 
@@ -6,11 +7,135 @@ from django.utils import timezone
 class Message(models.Model):
     contenu = models.TextField()
     date_envoi = models.DateTimeField(default=timezone.now)
-    owner = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True)
-    recipient = models.ForeignKey('auth.User', related_name='received_messages', on_delete=models.CASCADE, null=True, blank=True)
+    # Dernière écriture : clé du cache des fragments (une ligne de liste par
+    # version du message). Valeur par défaut côté base pour les insertions
+    # hors ORM (COPY de l'import).
+    modified = models.DateTimeField(auto_now=True, db_default=Now())
+    # Pas d'index simple sur les clés étrangères : les index composites
+    # ci-dessous commencent par ces colonnes et les remplacent.
+    owner = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+    recipient = models.ForeignKey('auth.User', related_name='received_messages', on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+
+    class Meta:
+        indexes = [
+            # Boîte d'envoi, export PDF, suppression groupée : owner=... ORDER BY -date_envoi, -id
+            models.Index(fields=['owner', '-date_envoi', '-id'], name='message_owner_date_id_idx'),
+            # Boîte de réception : recipient=... ORDER BY -date_envoi, -id
+            models.Index(fields=['recipient', '-date_envoi', '-id'], name='message_recipient_date_id_idx'),
+            # Fil du tableau de bord (curseur sur date_envoi, id) et agrégats par jour
+            models.Index(fields=['-date_envoi', '-id'], name='message_date_id_idx'),
+            # Version de la boîte (ETag) sans cache partagé : COUNT et MAX(modified)
+            # des reçus, MAX(modified) des envoyés, lus dans l'index seul
+            models.Index(fields=['recipient', 'modified'], name='message_recipient_modified_idx'),
+            models.Index(fields=['owner', 'modified'], name='message_owner_modified_idx'),
+        ]
+
     def __str__(self):
         return self.contenu[:20]
     
     def get_absolute_url(self):
         return reverse("message_detail", kwargs={"pk": self.pk})
     
+
+class DailyMessageStat(models.Model):
+    """Nombre de messages par jour, tenu à jour par ``mymessages.stats``."""
+    day = models.DateField(unique=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} : {self.count}"
+
+
+class OwnerMessageStat(models.Model):
+    """Nombre de messages par propriétaire (``owner`` vide : messages anonymes)."""
+    owner = models.OneToOneField('auth.User', related_name='message_stat', on_delete=models.CASCADE, null=True, blank=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.owner_id} : {self.count}"
+
+
+class StatsRevision(models.Model):
+    """Nombre de suppressions et de déplacements de messages (ligne unique).
+
+    Avec le plus grand identifiant de message, il date les statistiques :
+    une création change le premier, toute autre écriture qui les modifie
+    incrémente celui-ci (voir ``stats.version``).
+    """
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.count)
+
+
+class SeedMarker(models.Model):
+    """Jeu synthétique en place (ligne unique), écrit par ``seeding.seed``.
+
+    Absente pendant la génération : un jeu interrompu n'est pas reconnu.
+    """
+    seed = models.BigIntegerField()
+    users = models.PositiveIntegerField()
+    messages = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"graine {self.seed} : {self.messages} messages, {self.users} utilisateurs"
+
+
+class ImportJob(models.Model):
+    """Import CSV mis en file d'attente, traité par ``process_import_jobs``."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'En attente'),
+        (RUNNING, 'En cours'),
+        (DONE, 'Terminé'),
+        (FAILED, 'Échec'),
+    ]
+
+    owner = models.ForeignKey('auth.User', related_name='import_jobs', on_delete=models.CASCADE)
+    # Jobs antérieurs aux ImportChunk : fichier dans MEDIA_ROOT
+    csv_file = models.FileField(upload_to='imports/', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    success_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # Premières lignes rejetées : [[numéro de ligne, raison], ...]
+    errors = models.JSONField(default=list, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Reprise après l'arrêt d'un worker : dernière ligne du dernier lot validé
+    # et dernier signe de vie du worker qui traite le job
+    last_line = models.PositiveIntegerField(default=0)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created'])]
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+
+class ImportChunk(models.Model):
+    """Morceau du CSV d'un ``ImportJob``, gardé en base.
+
+    Le web et les workers ne partagent que la base : un worker sur une autre
+    machine lit le fichier sans disque commun.
+    """
+    job = models.ForeignKey(ImportJob, related_name='chunks', on_delete=models.CASCADE)
+    index = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'index'], name='importchunk_job_index_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Import #{self.job_id}, morceau {self.index}"
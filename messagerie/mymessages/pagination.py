@@ -0,0 +1,100 @@
+import base64
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def encode_cursor(message):
+    """Curseur opaque désignant la position ``(date_envoi, id)`` d'un message."""
+    raw = f"{message.date_envoi.isoformat()}|{message.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Renvoie ``(date_envoi, id)`` ; lève ValueError si le curseur est invalide."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_value, pk = raw.split('|')
+        date_envoi = parse_datetime(date_value)
+        pk = int(pk)
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError("Curseur invalide") from exc
+    if date_envoi is None:
+        raise ValueError("Curseur invalide")
+    return date_envoi, pk
+
+
+def after_cursor(queryset, cursor):
+    """Restreint ``queryset`` aux messages situés après ``cursor`` (ordre décroissant)."""
+    date_envoi, pk = decode_cursor(cursor)
+    # Équivaut à (date_envoi, id) < (date, pk) ; la première condition
+    # borne le parcours de l'index au lieu de le filtrer depuis le début.
+    return queryset.filter(
+        Q(date_envoi__lte=date_envoi),
+        Q(date_envoi__lt=date_envoi) | Q(id__lt=pk))
+
+
+def keyset_page(queryset, cursor=None, size=50):
+    """Page de ``size`` messages du plus récent au plus ancien, après ``cursor``.
+
+    Pagination par clé sur ``(date_envoi, id)`` : chaque page est une seule
+    requête indexée, quelle que soit sa profondeur (pas d'OFFSET).
+    Renvoie ``(messages, next_cursor)``, ``next_cursor`` valant None à la fin.
+    """
+    queryset = queryset.order_by('-date_envoi', '-id')
+    if cursor:
+        queryset = after_cursor(queryset, cursor)
+
+    # Un élément de plus pour savoir s'il reste une page
+    items = list(queryset[:size + 1])
+    if len(items) > size:
+        return items[:size], encode_cursor(items[size - 1])
+    return items, None
+
+
+def estimated_table_count(model, using):
+    """Estimation du nombre de lignes de la table de ``model``, ou None.
+
+    Lit ``pg_class.reltuples`` sur PostgreSQL (tenu à jour par ANALYZE et
+    l'autovacuum) ; None ailleurs, ou si la table n'a jamais été analysée.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                       [connection.ops.quote_name(model._meta.db_table)])
+        row = cursor.fetchone()
+    # -1 : jamais analysée (PostgreSQL 14+)
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator qui n'exécute pas de ``COUNT(*)`` sur une grande table non filtrée.
+
+    Sans filtre, le total vient de ``estimated_table_count`` puis, à défaut,
+    de ``fallback_count()`` (à redéfinir ; ``COUNT(*)`` par défaut). En
+    dessous de ``exact_below`` lignes estimées, ou dès qu'un filtre réduit la
+    liste, le total est exact.
+    """
+
+    exact_below = 10000
+
+    def fallback_count(self):
+        return super().count
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is None or queryset.query.has_filters():
+            return super().count
+        estimate = estimated_table_count(queryset.model, queryset.db)
+        if estimate is None:
+            return self.fallback_count()
+        if estimate < self.exact_below:
+            return super().count
+        return estimate
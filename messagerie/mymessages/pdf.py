@@ -0,0 +1,107 @@
+import zlib
+from reportlab.lib.pagesizes import letter
+
+
+class StreamingCanvas:
+    """Canvas PDF minimal qui produit le document page par page.
+
+    Le canvas ReportLab garde toutes les pages en mémoire jusqu'à ``save()``.
+    Celui-ci reprend le sous-ensemble d'API utilisé par nos exports
+    (``setFont``, ``drawString``, ``showPage``, ``save``), mais
+    ``showPage()`` renvoie immédiatement les octets de la page terminée :
+    seuls les numéros d'objets et leurs positions (pour la table ``xref``)
+    restent en mémoire. Polices : les polices standard Helvetica, en
+    WinAnsiEncoding pour les accents.
+    """
+
+    fonts = ('Helvetica', 'Helvetica-Bold')
+
+    # Objets réservés : 1 catalogue, 2 arbre des pages, puis les polices
+    _catalog = 1
+    _pages = 2
+
+    def __init__(self, pagesize=letter):
+        self.pagesize = pagesize
+        self._offsets = {}
+        self._position = 0
+        self._next_object = self._pages + len(self.fonts) + 1
+        self._kids = []
+        self._operations = []
+        self._font = None
+
+    def begin(self):
+        """Renvoie l'en-tête du document ; à émettre avant la première page."""
+        chunks = [self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")]
+        chunks.append(self._object(
+            self._catalog, f"<< /Type /Catalog /Pages {self._pages} 0 R >>"))
+        for number, name in enumerate(self.fonts, start=self._pages + 1):
+            chunks.append(self._object(
+                number, f"<< /Type /Font /Subtype /Type1 /BaseFont /{name} "
+                        "/Encoding /WinAnsiEncoding >>"))
+        return b"".join(chunks)
+
+    def setFont(self, name, size):
+        self._font = f"/F{self.fonts.index(name) + 1} {size} Tf"
+
+    def drawString(self, x, y, text):
+        encoded = text.encode('cp1252', errors='replace')
+        escaped = (encoded.replace(b"\\", b"\\\\")
+                   .replace(b"(", b"\\(").replace(b")", b"\\)"))
+        self._operations.append(
+            b"BT " + self._font.encode() + f" {x} {y} Td (".encode()
+            + escaped + b") Tj ET")
+
+    def showPage(self):
+        """Termine la page courante et renvoie ses octets."""
+        content = zlib.compress(b"\n".join(self._operations))
+        self._operations = []
+        content_number = self._reserve()
+        page_number = self._reserve()
+        self._kids.append(page_number)
+
+        font_refs = " ".join(
+            f"/F{index} {self._pages + index} 0 R"
+            for index in range(1, len(self.fonts) + 1))
+        width, height = self.pagesize
+        return self._object(
+            content_number,
+            f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode()
+            + content + b"\nendstream"
+        ) + self._object(
+            page_number,
+            f"<< /Type /Page /Parent {self._pages} 0 R "
+            f"/MediaBox [0 0 {width:g} {height:g}] "
+            f"/Resources << /Font << {font_refs} >> >> "
+            f"/Contents {content_number} 0 R >>")
+
+    def save(self):
+        """Renvoie la fin du document : arbre des pages, xref et trailer."""
+        kids = " ".join(f"{number} 0 R" for number in self._kids)
+        chunks = [self._object(
+            self._pages,
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._kids)} >>")]
+
+        xref_position = self._position
+        size = self._next_object
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[number]:010d} 00000 n \n"
+                     for number in range(1, size))
+        lines.append(f"trailer\n<< /Size {size} /Root {self._catalog} 0 R >>\n"
+                     f"startxref\n{xref_position}\n%%EOF\n")
+        chunks.append(self._emit("".join(lines).encode()))
+        return b"".join(chunks)
+
+    def _reserve(self):
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    def _object(self, number, body):
+        if isinstance(body, str):
+            body = body.encode()
+        self._offsets[number] = self._position
+        return self._emit(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _emit(self, data):
+        self._position += len(data)
+        return data
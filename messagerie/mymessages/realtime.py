@@ -0,0 +1,251 @@
+"""
+Diffusion en temps réel des nouveaux messages (Server-Sent Events).
+
+Chaque connexion SSE (``message_events``) s'abonne, pour son utilisateur,
+au courtier en mémoire de son processus et reçoit les messages qu'il
+envoie ou reçoit, publiés par les signaux (création unitaire) et par
+l'import.
+
+Sur PostgreSQL (psycopg 3), la publication passe par ``NOTIFY`` sur la base
+existante, sans broker externe : la notification part au commit de la
+transaction d'écriture (jamais si elle est annulée) vers tous les
+processus, et le ``Listener`` de chaque processus web qui a des abonnés la
+relaie à son courtier. Les écritures d'un autre worker gunicorn ou du
+worker des imports atteignent donc tous les clients. Ailleurs (SQLite), la
+publication reste dans le processus qui écrit, après le commit.
+
+Le flux est un générateur asynchrone : il demande un serveur ASGI
+(``messagerie.asgi``) pour ne pas occuper un thread par connexion.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.urls import reverse
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+# Événements gardés en attente par connexion ; au-delà, les plus anciens
+# sont perdus (le client n'a qu'à recharger la liste).
+QUEUE_SIZE = 100
+
+# Commentaire SSE envoyé en l'absence d'événement, pour garder la connexion
+KEEPALIVE_SECONDS = 15
+
+# Canal NOTIFY des nouveaux messages ; la charge utile (identifiants en
+# JSON) est limitée à 8000 octets, d'où des notifications par paquets.
+CHANNEL = 'mymessages_new_messages'
+NOTIFY_BATCH = 500
+
+# Attente maximale du LISTEN à l'ouverture du premier flux du processus,
+# et délai avant de se réabonner après une coupure de la connexion
+LISTEN_TIMEOUT = 5
+RECONNECT_SECONDS = 1
+
+
+class Subscription:
+    """File d'événements d'une connexion, alimentée depuis n'importe quel thread."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        # Appelé depuis le thread de la boucle uniquement
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_ids):
+        with self._lock:
+            return any(user_id in self._subscriptions for user_id in user_ids)
+
+    def is_empty(self):
+        with self._lock:
+            return not self._subscriptions
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            # Les vues synchrones tournent dans un autre thread que la boucle
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Boucle fermée : connexion en cours de fermeture
+                self.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+def uses_notify(connection):
+    """Vrai si les messages sont publiés à tous les processus par ``NOTIFY``."""
+    if connection.vendor != 'postgresql':
+        return False
+    # Réception (Connection.notifies) écrite pour psycopg 3
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    return is_psycopg3
+
+
+def publish_messages(messages):
+    """Publie ``messages`` à leurs propriétaires et destinataires après le commit."""
+    messages = list(messages)
+    if not messages:
+        return
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not uses_notify(connection):
+        transaction.on_commit(lambda: _publish(messages))
+        return
+    # NOTIFY est transactionnel : envoyé au commit de l'écriture
+    with connection.cursor() as cursor:
+        for start in range(0, len(messages), NOTIFY_BATCH):
+            ids = [message.pk for message in messages[start:start + NOTIFY_BATCH]]
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps(ids)])
+
+
+class Listener:
+    """Thread qui écoute ``CHANNEL`` sur sa propre connexion et relaie au courtier.
+
+    Démarré par le premier flux ouvert dans le processus : un processus
+    sans client SSE (worker des imports, commandes) n'écoute rien.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.ready = threading.Event()
+
+    def ensure_started(self):
+        with self._lock:
+            # Après un fork, le thread du parent n'existe plus
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self.ready.clear()
+            self._thread = threading.Thread(target=self._run, name='realtime-listener', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Écoute de %s interrompue, nouvel essai", CHANNEL)
+                self.ready.clear()
+                self._stop.wait(RECONNECT_SECONDS)
+
+    def _listen(self):
+        import psycopg
+
+        db_connection = connections[DEFAULT_DB_ALIAS]
+        # Connexion dédiée, hors du pool de Django : elle reste en LISTEN
+        # tant que le processus a des clients.
+        params = db_connection.get_connection_params()
+        with psycopg.connect(**params, autocommit=True) as raw:
+            raw.execute(f"LISTEN {CHANNEL}")
+            self.ready.set()
+            while not self._stop.is_set():
+                # Réveil régulier pour voir la demande d'arrêt
+                for notify in raw.notifies(timeout=1):
+                    if broker.is_empty():
+                        continue
+                    ids = json.loads(notify.payload)
+                    try:
+                        _publish(list(Message.objects.filter(pk__in=ids).order_by('id')))
+                    finally:
+                        # Rendue au pool comme en fin de requête
+                        db_connection.close_if_unusable_or_obsolete()
+
+
+listener = Listener()
+
+
+def _publish(messages):
+    user_ids = {message.owner_id for message in messages}
+    user_ids.update(message.recipient_id for message in messages)
+    user_ids.discard(None)
+    # Personne à l'écoute : aucune requête, aucun travail
+    if not broker.has_subscribers(user_ids):
+        return
+    usernames = dict(User.objects.filter(
+        pk__in=user_ids).values_list('pk', 'username'))
+    for message in messages:
+        event = {
+            'id': message.pk,
+            'contenu': message.contenu,
+            'date_envoi': message.date_envoi.isoformat(),
+            'owner_id': message.owner_id,
+            'owner': usernames.get(message.owner_id),
+            'recipient_id': message.recipient_id,
+            'recipient': usernames.get(message.recipient_id),
+            'url': reverse('message_detail', args=[message.pk]),
+        }
+        for user_id in {message.owner_id, message.recipient_id} - {None}:
+            broker.publish(user_id, event)
+
+
+def format_event(event):
+    """Sérialise ``event`` au format ``text/event-stream``."""
+    return (f"id: {event['id']}\nevent: message\n"
+            f"data: {json.dumps(event)}\n\n")
+
+
+async def event_stream(user_id, keepalive=KEEPALIVE_SECONDS):
+    subscription = broker.subscribe(user_id)
+    try:
+        if uses_notify(connections[DEFAULT_DB_ALIAS]):
+            listener.ensure_started()
+            # Pas de message écrit entre l'annonce et le LISTEN qui soit perdu
+            await asyncio.to_thread(listener.ready.wait, LISTEN_TIMEOUT)
+        # Première ligne immédiate : le client sait que l'abonnement est actif
+        yield ": connecté\n\n"
+        while True:
+            try:
+                event = await subscription.get(timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,237 @@
+"""
+Rapport PDF des statistiques, précalculé et mis en cache sur disque.
+
+Le PDF ne dépend que des statistiques (``stats.version()``) et de
+l'utilisateur qui le génère : sa clé est l'empreinte de ces deux valeurs, et
+sert aussi d'ETag. Tant qu'aucun message n'est écrit, le fichier déjà
+produit est renvoyé tel quel (ou un 304 si le client l'a déjà) ; toute
+écriture change la version, donc la clé, et le rapport suivant est régénéré.
+Les anciens fichiers sont évincés par âge et par taille totale.
+
+Un renommage d'utilisateur ne change pas la version : l'ancien nom reste
+affiché jusqu'à la prochaine écriture de message ou ``REPORT_CACHE_MAX_AGE``.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from . import metrics, stats
+
+# À incrémenter quand la mise en page change : invalide tous les fichiers
+REPORT_FORMAT = 1
+
+
+def report_key(username, version):
+    """Clé (et ETag) du rapport de ``username`` pour la version des statistiques."""
+    raw = f"stats-pdf:{REPORT_FORMAT}:{version}:{username}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def render_stats_pdf(username):
+    """Dessine le rapport statistique ; renvoie le contenu du PDF."""
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    # En-tête
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(50, height - 50, "Rapport Statistique - Messagerie DevOps")
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height - 70, f"Généré par : {username}")
+
+    # Récupération des données (identique à la vue home)
+    daily_stats = stats.daily_stats()
+    user_stats = stats.user_stats()
+
+    y = height - 110
+
+    # Section 1: Activité par jour
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, y, "1. Activité journalière (Nombre de messages)")
+    y -= 25
+    p.setFont("Helvetica", 12)
+
+    for stat in daily_stats:
+        if stat['date']:
+            date_str = stat['date'].strftime('%d/%m/%Y')
+            p.drawString(70, y, f"- {date_str} : {stat['count']} message(s)")
+            y -= 20
+            if y < 50:
+                p.showPage()
+                y = height - 50
+
+    y -= 20
+    # Section 2: Répartition par utilisateur
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, y, "2. Répartition par utilisateur")
+    y -= 25
+    p.setFont("Helvetica", 12)
+
+    for stat in user_stats:
+        username = stat['owner__username'] if stat['owner__username'] else 'Anonyme'
+        p.drawString(70, y, f"- {username} : {stat['count']} message(s)")
+        y -= 20
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+class ReportCache:
+    """Fichiers de rapport adressés par clé, dans ``directory``.
+
+    Un fichier plus vieux que ``max_age`` secondes est ignoré puis supprimé ;
+    au-delà de ``max_bytes`` au total, les fichiers les moins récemment
+    servis sont supprimés en premier. Les compteurs ``hits``/``misses`` sont
+    propres au processus ; ``/metrics`` agrège ceux de tous les processus.
+    """
+
+    suffix = '.pdf'
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """Fichier de ``key`` ouvert en lecture s'il est en cache et encore valide, sinon None.
+
+        Le fichier est ouvert ici : une éviction concurrente peut le retirer
+        du répertoire, le descripteur reste lisible jusqu'à sa fermeture.
+        """
+        path = self.path(key)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        if time.time() - os.fstat(file.fileno()).st_mtime > self.max_age:
+            file.close()
+            self._remove(path)
+            self._count(hit=False)
+            return None
+        # La date de modification sert d'horodatage de dernier accès (éviction)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self._count(hit=True)
+        return file
+
+    def put(self, key, content):
+        """Enregistre ``content`` sous ``key`` (jamais évincé par cet appel)."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Écriture atomique : un lecteur concurrent ne voit jamais de fichier partiel
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(content)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Supprime les fichiers expirés, puis les plus anciens au-delà de ``max_bytes``.
+
+        Le fichier de ``keep`` (celui qui vient d'être écrit) est conservé,
+        même s'il dépasse à lui seul ``max_bytes``.
+        """
+        kept = self.path(keep) if keep is not None else None
+        now = time.time()
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            if path == kept:
+                continue
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - info.st_mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((info.st_mtime, info.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if kept is not None:
+            try:
+                total += os.stat(kept).st_size
+            except FileNotFoundError:
+                pass
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc('messagerie_cache_requests_total',
+                    {'cache': 'stats_report', 'result': 'hit' if hit else 'miss'})
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_cache = None
+
+
+def get_cache():
+    """Cache des rapports configuré par ``REPORT_CACHE_*`` (créé au premier appel)."""
+    global _cache
+    config = (settings.REPORT_CACHE_DIR, settings.REPORT_CACHE_MAX_BYTES,
+              settings.REPORT_CACHE_MAX_AGE)
+    if _cache is None or (_cache.directory, _cache.max_bytes, _cache.max_age) != config:
+        _cache = ReportCache(*config)
+    return _cache
+
+
+def stats_report_key(username):
+    return report_key(username, stats.version())
+
+
+def get_stats_report(username, key=None):
+    """Renvoie ``(fichier, clé, trouvé_en_cache)`` du rapport de ``username``.
+
+    ``fichier`` est déjà ouvert (fichier du cache, ou contenu tout juste
+    dessiné en mémoire) : une éviction ne peut plus le faire disparaître.
+    Le PDF n'est dessiné que si le fichier de la version courante manque.
+    """
+    if key is None:
+        key = stats_report_key(username)
+    cache = get_cache()
+    file = cache.get(key)
+    if file is not None:
+        return file, key, True
+    with metrics.timer('messagerie_pdf_render_seconds', {'report': 'stats'}):
+        content = render_stats_pdf(username)
+    cache.put(key, content)
+    return io.BytesIO(content), key, False
@@ -0,0 +1,67 @@
+"""
+Routage des lectures vers les réplicas (``DATABASE_REPLICA_URLS``).
+
+Seules les vues marquées par ``replica_reads`` (ou dont la classe définit
+``use_replica = True``) lisent sur un réplica, et seulement pour une requête
+GET/HEAD : ``ReplicaRoutingMiddleware`` pose l'état de la requête, que
+``ReplicaRouter`` consulte. Après une écriture (POST...), la session lit le
+primaire pendant ``DATABASE_REPLICA_STICKY_SECONDS`` : l'utilisateur voit
+toujours ses propres écritures malgré le retard de réplication. Sans
+réplica configuré, tout va sur ``default``.
+"""
+
+import random
+from contextvars import ContextVar
+from django.conf import settings
+
+# État de la requête en cours ; un objet mutable, pour que la décision prise
+# dans process_view soit visible du contexte de la vue, même sous ASGI.
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+class RequestState:
+    def __init__(self):
+        self.read_alias = None
+
+
+def replica_reads(view):
+    """Marque une vue en lecture seule : ses lectures peuvent aller sur un réplica."""
+    view.use_replica = True
+    return view
+
+
+def start_request():
+    """Ouvre l'état de routage d'une requête ; renvoie le jeton pour ``end_request``."""
+    return _request_state.set(RequestState())
+
+
+def end_request(token):
+    _request_state.reset(token)
+
+
+def use_replica():
+    """Envoie les lectures de la requête en cours sur un réplica, s'il y en a."""
+    state = _request_state.get()
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    if state is not None and replicas:
+        # Un seul réplica par requête : des lectures cohérentes entre elles
+        state.read_alias = random.choice(replicas)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        # La session vient peut-être d'être écrite : toujours le primaire
+        if state is not None and model._meta.app_label != 'sessions':
+            return state.read_alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primaire et réplicas contiennent les mêmes données
+        databases = {'default', *getattr(settings, 'DATABASE_REPLICAS', [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,154 @@
+"""
+Recherche plein texte dans les messages.
+
+Le backend est choisi selon la base (``get_search_backend``) ou imposé par
+``settings.MESSAGE_SEARCH_BACKEND`` (chemin pointé d'une classe) :
+
+- PostgreSQL : colonne ``search_vector`` (tsvector générée à partir de
+  ``contenu`` sans accents, donc toujours à jour) indexée en GIN ;
+- SQLite : table virtuelle FTS5 ``mymessages_message_fts`` synchronisée par
+  des triggers ;
+- autres bases : ``icontains``, comme avant.
+
+Dans tous les cas la recherche porte aussi sur le nom de l'auteur.
+"""
+
+import re
+import unicodedata
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+FTS_TABLE = 'mymessages_message_fts'
+
+# Index FTS5 « external content » : le texte reste dans mymessages_message,
+# les triggers tiennent l'index à jour pour toute écriture SQL (ORM, import
+# par lots, suppression brute).
+SQLITE_FTS_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "contenu, content='mymessages_message', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON mymessages_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, contenu) VALUES (new.id, new.contenu); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON mymessages_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, contenu) VALUES ('delete', old.id, old.contenu); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF contenu ON mymessages_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, contenu) VALUES ('delete', old.id, old.contenu); "
+    f"INSERT INTO {FTS_TABLE}(rowid, contenu) VALUES (new.id, new.contenu); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+# Lettres latines accentuées (Latin-1 et Latin étendu A) et leur lettre de
+# base, pour translate() : sans l'extension unaccent, que toutes les bases
+# hébergées ne proposent pas. Comme remove_diacritics de FTS5 côté SQLite.
+_ACCENTED = ''.join(
+    char for char in map(chr, range(0xC0, 0x180))
+    if len(decomposed := unicodedata.normalize('NFD', char)) > 1
+    and decomposed[0].isascii() and decomposed[0].isalpha()
+    and all(unicodedata.combining(mark) for mark in decomposed[1:]))
+_UNACCENTED = ''.join(unicodedata.normalize('NFD', char)[0] for char in _ACCENTED)
+
+POSTGRES_SEARCH_SQL = [
+    # IMMUTABLE : utilisable dans la colonne générée
+    "CREATE OR REPLACE FUNCTION mymessages_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE "
+    f"AS $$ SELECT translate($1, '{_ACCENTED}', '{_UNACCENTED}') $$",
+    "ALTER TABLE mymessages_message ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', mymessages_unaccent(coalesce(contenu, '')))) STORED",
+    "CREATE INDEX IF NOT EXISTS message_search_vector_idx "
+    "ON mymessages_message USING gin (search_vector)",
+]
+
+
+def _terms(query):
+    return re.findall(r'\w+', query)
+
+
+class IcontainsSearchBackend:
+    """Recherche par sous-chaîne (``LIKE '%...%'``), sans index."""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(contenu__icontains=query) | self._author_filter(query))
+
+    def annotate_rank(self, queryset, query):
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+    @staticmethod
+    def _author_filter(query):
+        # Sous-requête sur auth_user plutôt qu'une jointure : pas de doublons,
+        # donc pas de DISTINCT sur les messages.
+        return Q(owner_id__in=User.objects.filter(
+            username__icontains=query).values('id'))
+
+
+class SqliteFtsSearchBackend(IcontainsSearchBackend):
+    """Recherche FTS5 : mots préfixes, insensible à la casse et aux accents."""
+
+    @staticmethod
+    def _match(query):
+        return " ".join('"%s"*' % term for term in _terms(query))
+
+    def search(self, queryset, query):
+        match = self._match(query)
+        if not match:
+            return queryset.filter(self._author_filter(query))
+        return queryset.filter(
+            Q(id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+            | self._author_filter(query))
+
+    def annotate_rank(self, queryset, query):
+        match = self._match(query)
+        if not match:
+            return super().annotate_rank(queryset, query)
+        # bm25() est d'autant plus petit que le message est pertinent
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = mymessages_message.id",
+            [match], output_field=FloatField())
+        return queryset.annotate(rank=Coalesce(rank, Value(0.0)))
+
+
+class PostgresSearchBackend(IcontainsSearchBackend):
+    """Recherche sur la colonne tsvector ``search_vector`` (index GIN)."""
+
+    @staticmethod
+    def _tsquery(query):
+        return " & ".join(f"{term}:*" for term in _terms(query))
+
+    def search(self, queryset, query):
+        tsquery = self._tsquery(query)
+        if not tsquery:
+            return queryset.filter(self._author_filter(query))
+        return queryset.filter(
+            Q(id__in=RawSQL(
+                "SELECT id FROM mymessages_message "
+                "WHERE search_vector @@ to_tsquery('simple', mymessages_unaccent(%s))", [tsquery]))
+            | self._author_filter(query))
+
+    def annotate_rank(self, queryset, query):
+        tsquery = self._tsquery(query)
+        if not tsquery:
+            return super().annotate_rank(queryset, query)
+        return queryset.annotate(rank=RawSQL(
+            "ts_rank(mymessages_message.search_vector, "
+            "to_tsquery('simple', mymessages_unaccent(%s)))",
+            [tsquery], output_field=FloatField()))
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteFtsSearchBackend,
+}
+
+
+def get_search_backend():
+    path = getattr(settings, 'MESSAGE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, IcontainsSearchBackend)()
@@ -0,0 +1,88 @@
+"""
+Jeu de données synthétique pour les benchmarks et les essais de charge.
+
+Répartition réaliste : quelques utilisateurs très actifs, beaucoup de peu
+actifs (poids en 1/rang, pour l'envoi comme pour la réception), 10 % de
+messages sans destinataire, dates étalées sur l'année qui précède
+``EPOCH``. Avec la même graine et la même taille, le jeu généré est
+identique d'une exécution et d'un jour à l'autre, quelle que soit la taille
+des lots ; ``SeedMarker`` garde la graine et la taille du jeu en place. Une
+base qui contient d'autres messages que ceux des utilisateurs ``bench_*``
+n'est pas touchée, sauf avec ``force``.
+"""
+
+import bisect
+import itertools
+import random
+from datetime import datetime, timedelta, timezone
+from django.contrib.auth.models import User
+from django.db.models import Q
+from . import deletion, stats
+from .models import Message, SeedMarker
+
+USERNAME_PREFIX = 'bench_'
+
+# Date fixe, et non l'heure courante : les dates du jeu ne bougent pas d'un
+# jour à l'autre. Les messages les plus récents datent d'avant EPOCH.
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def is_seeded(users, messages, seed=42):
+    """Vrai si la base contient déjà exactement ce jeu de données."""
+    marker = SeedMarker.objects.first()
+    # Le marqueur dit quel jeu a été généré ; les comptages, qu'il n'a pas
+    # été modifié depuis
+    return (marker is not None
+            and (marker.seed, marker.users, marker.messages) == (seed, users, messages)
+            and Message.objects.count() == messages
+            and User.objects.filter(username__startswith=USERNAME_PREFIX).count() == users)
+
+
+def foreign_messages():
+    """Messages étrangers au jeu : envoyés ou reçus par un autre utilisateur."""
+    bench_users = User.objects.filter(username__startswith=USERNAME_PREFIX).values('pk')
+    return Message.objects.filter(
+        ~Q(owner__in=bench_users)
+        | Q(recipient__isnull=False) & ~Q(recipient__in=bench_users))
+
+
+def seed(users, messages, seed=42, batch_size=10000, force=False):
+    """Remplace tous les messages par ``messages`` messages entre ``users`` utilisateurs.
+
+    Les utilisateurs ``bench_0`` à ``bench_<users - 1>`` sont recréés
+    (``bench_0`` est le plus actif) ; les statistiques sont reconstruites.
+    Lève ``ValueError`` si la base contient des messages étrangers au jeu,
+    sauf avec ``force`` : ils sont alors supprimés aussi.
+    """
+    if not force and foreign_messages().exists():
+        raise ValueError("La base contient des messages hors du jeu synthétique (bench_*)")
+    SeedMarker.objects.all().delete()
+    # Par lots, sans charger les messages ni émettre leurs signaux
+    deletion.delete_messages(Message.objects.all())
+    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    User.objects.bulk_create(
+        [User(username=f"{USERNAME_PREFIX}{i}") for i in range(users)], batch_size=batch_size)
+    user_ids = list(User.objects.filter(
+        username__startswith=USERNAME_PREFIX).order_by('id').values_list('id', flat=True))
+    # Poids en 1/rang, cumulés une fois pour le tirage par bisection
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, users + 1)))
+
+    rng = random.Random(seed)
+
+    def pick():
+        return user_ids[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+    def message(number):
+        # Tirages dans un ordre fixe, message par message : le découpage en
+        # lots ne change pas le jeu
+        owner_id, recipient_id = pick(), pick()
+        return Message(contenu=f"Message de test n°{number} sur le déploiement",
+                       owner_id=owner_id,
+                       recipient_id=recipient_id if rng.random() > 0.1 else None,
+                       date_envoi=EPOCH - timedelta(seconds=rng.randrange(365 * 86400)))
+
+    for start in range(0, messages, batch_size):
+        Message.objects.bulk_create(
+            message(number) for number in range(start, min(start + batch_size, messages)))
+    stats.rebuild()
+    SeedMarker.objects.create(seed=seed, users=users, messages=messages)
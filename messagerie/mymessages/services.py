@@ -1,29 +1,226 @@
+import codecs
 import csv
+import io
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from . import metrics, realtime, stats, summary
 from .models import Message
 
 
+# Détail d'une ligne rejetée : numéro de ligne dans le fichier et raison
+RowError = namedtuple('RowError', ['line', 'reason'])
+
+# Ligne validée, en attente de résolution des utilisateurs
+ParsedRow = namedtuple(
+    'ParsedRow', ['line', 'contenu', 'date_envoi', 'owner', 'recipient'])
+
+
+class OrmBatchWriter:
+    """Écrit un lot via l'ORM : une requête pour les utilisateurs, un bulk_create."""
+
+    def write(self, rows):
+        usernames = {row.owner for row in rows}
+        usernames.update(row.recipient for row in rows if row.recipient)
+        users = dict(User.objects.filter(
+            username__in=usernames).values_list('username', 'id'))
+
+        new_messages = []
+        errors = []
+        for row in rows:
+            owner_id = users.get(row.owner)
+            if owner_id is None:
+                errors.append(RowError(row.line, f"Utilisateur inconnu : {row.owner}"))
+                continue
+            new_messages.append(Message(
+                contenu=row.contenu, date_envoi=row.date_envoi,
+                owner_id=owner_id, recipient_id=users.get(row.recipient)))
+
+        return Message.objects.bulk_create(new_messages), errors
+
+
+class PostgresCopyWriter:
+    """Écrit un lot via ``COPY`` dans une table de transit (PostgreSQL + psycopg 3).
+
+    Les lignes validées sont copiées telles quelles, puis un unique
+    ``INSERT ... SELECT`` joint ``auth_user`` pour résoudre propriétaires et
+    destinataires côté serveur.
+    """
+
+    staging_table = 'mymessages_import_staging'
+
+    @staticmethod
+    def is_available():
+        if connection.vendor != 'postgresql':
+            return False
+        # cursor.copy() n'existe que dans psycopg 3
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        return is_psycopg3
+
+    def write(self, rows):
+        qn = connection.ops.quote_name
+        staging = qn(self.staging_table)
+        message_table = qn(Message._meta.db_table)
+        user_table = qn(User._meta.db_table)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for row in rows:
+            writer.writerow([row.line, row.contenu, row.date_envoi.isoformat(),
+                             row.owner, row.recipient])
+
+        with connection.cursor() as cursor:
+            # Table temporaire propre à la connexion, vidée à chaque commit
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ("
+                "line integer, contenu text, date_envoi timestamptz, "
+                "owner text, recipient text) ON COMMIT DELETE ROWS")
+            # Dans une transaction englobante (ATOMIC_REQUESTS, atomic()
+            # appelant), le commit n'a pas lieu entre deux lots : sans ce
+            # vidage, chaque lot réinsérerait les précédents.
+            cursor.execute(f"TRUNCATE {staging}")
+            with cursor.cursor.copy(
+                    f"COPY {staging} (line, contenu, date_envoi, owner, recipient) "
+                    "FROM STDIN WITH (FORMAT csv)") as copy:
+                copy.write(buffer.getvalue())
+            cursor.execute(
+                f"INSERT INTO {message_table} (contenu, date_envoi, owner_id, recipient_id) "
+                f"SELECT s.contenu, s.date_envoi, o.id, r.id FROM {staging} s "
+                f"JOIN {user_table} o ON o.username = s.owner "
+                f"LEFT JOIN {user_table} r ON r.username = s.recipient "
+                "ORDER BY s.line "
+                "RETURNING id, contenu, date_envoi, owner_id, recipient_id")
+            created = [
+                Message(id=id, contenu=contenu, date_envoi=date_envoi,
+                        owner_id=owner_id, recipient_id=recipient_id)
+                for id, contenu, date_envoi, owner_id, recipient_id in cursor.fetchall()]
+            cursor.execute(
+                f"SELECT s.line, s.owner FROM {staging} s "
+                f"LEFT JOIN {user_table} o ON o.username = s.owner "
+                "WHERE o.id IS NULL ORDER BY s.line")
+            errors = [RowError(line, f"Utilisateur inconnu : {owner}")
+                      for line, owner in cursor.fetchall()]
+
+        return created, errors
+
+
 class MessageImportService:
-    def import_csv(self, csv_file):
-        decoded_file = csv_file.read().decode('utf-8').splitlines()
-        reader = csv.reader(decoded_file)
+    """Importe des messages depuis un CSV ``contenu, date, owner[, recipient]``.
+
+    Le fichier est lu en flux, ligne par ligne, et traité par lots de
+    ``batch_size`` lignes écrits chacun dans une transaction. Le backend
+    ``orm`` résout les utilisateurs du lot en une requête puis utilise
+    ``bulk_create`` ; le backend ``copy`` passe par ``COPY`` sur PostgreSQL
+    et se replie sur ``orm`` ailleurs. Le détail des lignes rejetées est
+    disponible dans ``errors``, limité aux ``max_errors`` premières (toutes
+    si None) : les rejets au-delà sont seulement comptés.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, batch_size=None, backend=None, max_errors=None):
+        if batch_size is not None:
+            self.batch_size = batch_size
+        self.backend = backend or getattr(settings, 'MESSAGE_IMPORT_BACKEND', 'orm')
+        self.max_errors = max_errors
+        self.errors = []
 
+    def get_writer(self):
+        if self.backend == 'copy' and PostgresCopyWriter.is_available():
+            return PostgresCopyWriter()
+        return OrmBatchWriter()
+
+    def import_csv(self, csv_file, progress=None, start_after=0):
+        """Importe ``csv_file`` et renvoie ``(success_count, error_count)``.
+
+        ``progress``, s'il est fourni, est appelé après chaque lot avec les
+        compteurs cumulés et le numéro de la dernière ligne du lot, dans la
+        transaction du lot : un lot n'est validé qu'avec sa progression
+        (utilisé par les imports en arrière-plan). ``start_after`` ignore
+        les lignes jusqu'à ce numéro inclus (reprise d'un import interrompu).
+        """
+        self.errors = []
+        writer = self.get_writer()
         success_count = 0
         error_count = 0
 
-        for row in reader:
-            if row:
-                try:
-                    user = User.objects.get(username=row[2])
-                    recipient = None
-                    if len(row) > 3 and row[3]:
-                        recipient = User.objects.filter(
-                            username=row[3]).first()
-
-                    Message.objects.create(
-                        contenu=row[0], date_envoi=row[1], owner=user, recipient=recipient)
-                    success_count += 1
-                except (User.DoesNotExist, IndexError, Exception):
-                    error_count += 1
+        for batch in self._read_batches(csv_file, start_after):
+            with transaction.atomic() if progress is not None else nullcontext():
+                start = time.perf_counter()
+                created, failed = self._import_batch(writer, batch)
+                success_count += created
+                error_count += failed
+                if progress is not None:
+                    progress(success_count, error_count, batch[-1][0])
+            # Débit (lignes/s) = rows_total / seconds_total
+            metrics.inc('messagerie_import_seconds_total', value=time.perf_counter() - start)
+            metrics.inc('messagerie_import_rows_total', {'result': 'imported'}, created)
+            metrics.inc('messagerie_import_rows_total', {'result': 'rejected'}, failed)
 
         return success_count, error_count
+
+    def _read_batches(self, csv_file, start_after=0):
+        # Itérer sur le fichier le lit par morceaux : on ne garde jamais
+        # plus d'un lot de lignes en mémoire.
+        reader = csv.reader(codecs.iterdecode(csv_file, 'utf-8'))
+        batch = []
+        for row in reader:
+            if row and reader.line_num > start_after:
+                batch.append((reader.line_num, row))
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _import_batch(self, writer, batch):
+        rows = []
+        errors = []
+        for line, row in batch:
+            try:
+                rows.append(self._parse_row(line, row))
+            except (IndexError, ValidationError) as exc:
+                errors.append(RowError(line, self._describe(exc)))
+
+        created = []
+        if rows:
+            try:
+                with transaction.atomic():
+                    created, write_errors = writer.write(rows)
+                    # bulk_create et COPY n'émettent pas de signaux
+                    stats.record(created)
+                    summary.invalidate(created)
+                    realtime.publish_messages(created)
+            except DatabaseError as exc:
+                write_errors = [RowError(row.line, str(exc)) for row in rows]
+            errors.extend(write_errors)
+
+        # Mémoire bornée même pour un fichier entièrement rejeté
+        room = (len(errors) if self.max_errors is None
+                else max(0, self.max_errors - len(self.errors)))
+        self.errors.extend(sorted(errors)[:room])
+        return len(created), len(batch) - len(created)
+
+    def _parse_row(self, line, row):
+        contenu, date_value, owner = row[0], row[1], row[2]
+        recipient = row[3] if len(row) > 3 else ''
+
+        date_envoi = Message._meta.get_field('date_envoi').to_python(
+            date_value.strip())
+        if date_envoi is None:
+            raise ValidationError("Date manquante")
+        if timezone.is_naive(date_envoi):
+            date_envoi = timezone.make_aware(date_envoi)
+
+        return ParsedRow(line, contenu, date_envoi, owner, recipient)
+
+    @staticmethod
+    def _describe(exc):
+        if isinstance(exc, IndexError):
+            return "Colonnes manquantes"
+        return "Date invalide : " + " ".join(exc.messages)
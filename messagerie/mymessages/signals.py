@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import instrumentation, metrics, realtime, stats, summary
+from .models import Message
+
+
+@receiver(pre_save, sender=Message)
+def remember_stats_key(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Pour une modification, on relit la date, le propriétaire et le
+    # destinataire d'origine : s'ils changent, le message passe d'un
+    # compteur (et d'un résumé de boîte) à l'autre.
+    instance._stats_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not {'date_envoi', 'owner', 'recipient'} & set(update_fields):
+        return
+    previous = Message.objects.filter(pk=instance.pk).values(
+        'date_envoi', 'owner_id', 'recipient_id').first()
+    if previous:
+        instance._stats_previous = SimpleNamespace(**previous)
+
+
+@receiver(post_save, sender=Message)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.record([instance])
+        summary.invalidate([instance])
+        realtime.publish_messages([instance])
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    # Toute modification change la version de la boîte (ETag des vues)
+    summary.invalidate([instance] if previous is None else [previous, instance])
+    if previous is not None and (previous.date_envoi, previous.owner_id) != (
+            instance.date_envoi, instance.owner_id):
+        with stats.batch():
+            stats.record([previous], delta=-1)
+            stats.record([instance])
+
+
+@receiver(post_delete, sender=Message)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.record([instance], delta=-1)
+    summary.invalidate([instance])
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    # Rapporté au nombre de requêtes : mesure la réutilisation (conn_max_age)
+    metrics.inc('messagerie_db_connections_opened_total', {'alias': connection.alias})
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Compteur permanent : les connexions sont propres à chaque thread, et
+    # seule la ContextVar de la requête suit la vue jusqu'au sien.
+    if instrumentation.record_query not in connection.execute_wrappers:
+        # En tête : ne pas gêner un execute_wrapper() en cours, qui retire le dernier
+        connection.execute_wrappers.insert(0, instrumentation.record_query)
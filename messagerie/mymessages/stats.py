@@ -0,0 +1,144 @@
+"""
+Statistiques matérialisées du tableau de bord.
+
+Les compteurs par jour (``DailyMessageStat``) et par propriétaire
+(``OwnerMessageStat``) sont mis à jour à chaque écriture de message : par les
+signaux pour les écritures unitaires, explicitement par les chemins en masse
+(import, suppression groupée). Le tableau de bord et le PDF de statistiques
+lisent ainsi O(jours + utilisateurs) lignes au lieu de parcourir tous les
+messages. ``rebuild()`` (commande ``rebuild_message_stats``) recalcule tout.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyMessageStat, Message, OwnerMessageStat, StatsRevision
+
+# Ligne unique de StatsRevision
+REVISION_PK = 1
+
+# Compteurs en attente pendant un bloc ``batch()``
+_pending = ContextVar('message_stats_pending', default=None)
+
+
+def record(messages, delta=1):
+    """Ajoute ``delta`` aux compteurs pour chacun des ``messages``."""
+    days = Counter()
+    owners = Counter()
+    for message in messages:
+        days[_day(message.date_envoi)] += delta
+        owners[message.owner_id] += delta
+
+    pending = _pending.get()
+    if pending is None:
+        _apply(days, owners)
+    else:
+        pending[0].update(days)
+        pending[1].update(owners)
+
+
+@contextmanager
+def batch():
+    """Regroupe les mises à jour des compteurs jusqu'à la fin du bloc.
+
+    Une suppression de 1000 messages sur un même jour donne alors une seule
+    mise à jour par jour et par propriétaire, au lieu de deux par message.
+    """
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = (Counter(), Counter())
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    _apply(*pending)
+
+
+def _day(value):
+    # Même découpage que TruncDate : jour dans le fuseau courant
+    value = Message._meta.get_field('date_envoi').to_python(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return timezone.localdate(value)
+
+
+def _apply(days, owners):
+    # Une création change le plus grand identifiant ; une suppression ou un
+    # déplacement (delta négatif) doit changer la révision.
+    if any(delta < 0 for delta in (*days.values(), *owners.values())):
+        _increment(StatsRevision, {'pk': REVISION_PK}, 1)
+    for day, delta in days.items():
+        if delta:
+            _increment(DailyMessageStat, {'day': day}, delta)
+    for owner_id, delta in owners.items():
+        if delta:
+            _increment(OwnerMessageStat, {'owner_id': owner_id}, delta)
+
+
+def _increment(model, lookup, delta):
+    if model.objects.filter(**lookup).update(count=F('count') + delta) or delta < 0:
+        # Un retrait ne crée jamais de ligne : lors de la suppression d'un
+        # utilisateur, la cascade a déjà effacé son compteur.
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre requête
+        model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def daily_stats():
+    """Messages par jour, au format de l'ancienne agrégation ``TruncDay``."""
+    return [{'date': day, 'count': count}
+            for day, count in DailyMessageStat.objects.filter(
+                count__gt=0).order_by('day').values_list('day', 'count')]
+
+
+def user_stats():
+    """Messages par propriétaire, triés par nombre décroissant."""
+    return (OwnerMessageStat.objects.values('owner__username')
+            .annotate(count=Sum('count')).filter(count__gt=0)
+            .order_by('-count'))
+
+
+def total():
+    """Nombre total de messages, sans parcourir la table des messages."""
+    return DailyMessageStat.objects.aggregate(total=Sum('count'))['total'] or 0
+
+
+def version():
+    """Version des statistiques : change dès que ``daily_stats``/``user_stats`` changent.
+
+    Deux requêtes sur index, quel que soit le volume : le plus grand
+    identifiant de message et la révision.
+    """
+    max_id = Message.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    revision = StatsRevision.objects.filter(pk=REVISION_PK).values_list(
+        'count', flat=True).first() or 0
+    return f"{max_id}.{revision}"
+
+
+@transaction.atomic
+def rebuild():
+    """Recalcule tous les compteurs à partir de la table des messages."""
+    _increment(StatsRevision, {'pk': REVISION_PK}, 1)
+    DailyMessageStat.objects.all().delete()
+    OwnerMessageStat.objects.all().delete()
+
+    daily = Message.objects.annotate(day=TruncDate('date_envoi')).values(
+        'day').annotate(count=Count('id')).order_by()
+    DailyMessageStat.objects.bulk_create(
+        DailyMessageStat(day=row['day'], count=row['count']) for row in daily)
+
+    owners = Message.objects.values('owner_id').annotate(
+        count=Count('id')).order_by()
+    OwnerMessageStat.objects.bulk_create(
+        OwnerMessageStat(owner_id=row['owner_id'], count=row['count']) for row in owners)
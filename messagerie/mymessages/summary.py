@@ -0,0 +1,150 @@
+"""
+Résumé de la boîte de chaque utilisateur : messages reçus, envoyés et date
+du dernier message.
+
+Le résumé est calculé à la demande puis gardé dans le cache Django
+(``CACHES``, mémoire locale par défaut). Toute écriture de message invalide
+l'entrée de son propriétaire et de son destinataire : les signaux pour les
+écritures unitaires, explicitement pour l'import et la suppression groupée.
+Un affichage sur cache chaud ne coûte donc aucune requête.
+
+Le résumé sert aussi de version de la boîte (``version()``) : ETag de la
+liste et du détail des messages. Avec un cache propre à chaque processus
+(mémoire locale), l'invalidation ne touche que le processus qui a écrit :
+les autres workers garderaient une version périmée, la version est alors
+relue en base à chaque fois, par des agrégats servis par les index.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router, transaction
+from django.db.models import Count, Max
+from . import metrics
+from .models import Message, OwnerMessageStat
+
+# Durée de vie de secours, au cas où une invalidation serait manquée
+SUMMARY_TIMEOUT = 300
+
+# Utilisateurs à invalider à la fin d'un bloc ``batch()``
+_pending = ContextVar('inbox_summary_pending', default=None)
+
+
+def cache_key(user_id):
+    # v3 : retrait de 'computed'
+    return f"mymessages:inbox_summary:v3:{user_id}"
+
+
+def get_summary(user):
+    """Renvoie ``{'received', 'sent', 'last_message', 'modified'}`` pour ``user``."""
+    key = cache_key(user.pk)
+    summary = cache.get(key)
+    metrics.inc('messagerie_cache_requests_total', {
+        'cache': 'inbox_summary', 'result': 'miss' if summary is None else 'hit'})
+    if summary is None:
+        summary = _compute(user)
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def _compute(user):
+    # Toujours sur le primaire : un résumé lu sur un réplica en retard
+    # resterait en cache jusqu'à la prochaine écriture.
+    messages = Message.objects.using(router.db_for_write(Message))
+    # Reçus : parcours de l'index (recipient, -date_envoi, -id) ; envoyés :
+    # compteur matérialisé par stats, plus la date la plus récente par index.
+    received = messages.filter(recipient=user).aggregate(
+        count=Count('id'), last=Max('date_envoi'), modified=Max('modified'))
+    sent = (OwnerMessageStat.objects.using(messages.db).filter(owner=user)
+            .values_list('count', flat=True).first()) or 0
+    last_sent = messages.filter(owner=user).aggregate(
+        last=Max('date_envoi'), modified=Max('modified'))
+    dates = [date for date in (received['last'], last_sent['last']) if date is not None]
+    modified = [date for date in (received['modified'], last_sent['modified'])
+                if date is not None]
+    return {
+        'received': received['count'],
+        'sent': sent,
+        'last_message': max(dates) if dates else None,
+        'modified': max(modified) if modified else None,
+    }
+
+
+def _compute_version(user):
+    # Sous-ensemble du résumé utile à la version, sans cache : reçus par
+    # l'index (recipient, modified) seul, dernière modification des envoyés
+    # par (owner, modified), compteur des envoyés matérialisé par stats.
+    messages = Message.objects.using(router.db_for_write(Message))
+    received = messages.filter(recipient=user).aggregate(
+        count=Count('id'), modified=Max('modified'))
+    sent = (OwnerMessageStat.objects.using(messages.db).filter(owner=user)
+            .values_list('count', flat=True).first()) or 0
+    last_sent = messages.filter(owner=user).aggregate(modified=Max('modified'))
+    modified = [date for date in (received['modified'], last_sent['modified'])
+                if date is not None]
+    return {
+        'received': received['count'],
+        'sent': sent,
+        'modified': max(modified) if modified else None,
+    }
+
+
+def is_shared_cache():
+    """Vrai si le cache est commun à tous les processus (invalidations visibles partout)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def version(user):
+    """Version de la boîte de ``user`` : une étiquette pour l'ETag.
+
+    Une création ou une modification avance ``modified``, une suppression
+    ou un déplacement change un des compteurs : l'étiquette change à chaque
+    écriture qui touche la boîte. Lue dans le résumé avec un cache partagé,
+    recalculée sur le primaire sinon (voir ``is_shared_cache``).
+    """
+    summary = get_summary(user) if is_shared_cache() else _compute_version(user)
+    modified = summary['modified'].timestamp() if summary['modified'] else ''
+    return f"{user.pk}.{summary['received']}.{summary['sent']}.{modified}"
+
+
+def invalidate(messages):
+    """Invalide le résumé des propriétaires et destinataires de ``messages``."""
+    user_ids = set()
+    for message in messages:
+        user_ids.add(message.owner_id)
+        user_ids.add(message.recipient_id)
+    user_ids.discard(None)
+
+    pending = _pending.get()
+    if pending is None:
+        _delete(user_ids)
+    else:
+        pending.update(user_ids)
+
+
+@contextmanager
+def batch():
+    """Regroupe les invalidations jusqu'à la fin du bloc (une seule par utilisateur)."""
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = set()
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    _delete(pending)
+
+
+def _delete(user_ids):
+    if not user_ids:
+        return
+    keys = [cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    # Une autre requête a pu recalculer le résumé avant le commit, à partir
+    # des données d'avant l'écriture : on invalide à nouveau une fois validé.
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,60 @@
+"""
+Rendu des lignes de message avec cache de fragments.
+
+``{% message_rows messages 'message_row.html' %}`` rend chaque message avec
+le template de ligne donné, en réutilisant le HTML déjà produit pour la même
+version du message (``pk`` et ``modified``). Une page entière coûte une
+lecture groupée (``get_many``) et, pour les lignes manquantes, une écriture
+groupée : deux allers-retours au cache, quel que soit le nombre de lignes.
+
+Le template de ligne ne voit que ``message`` et ``request`` (pas de
+processeurs de contexte). Avec ``per_user=True``, la clé inclut
+l'utilisateur connecté, pour les lignes qui dépendent du point de vue
+(envoyé ou reçu). Un renommage d'utilisateur n'apparaît qu'après
+``MESSAGE_ROW_CACHE_TIMEOUT`` ; ``0`` désactive le cache.
+"""
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+# À incrémenter quand un template de ligne change de forme
+ROW_CACHE_VERSION = 1
+
+
+def row_cache_key(template_name, message, viewer_id=None):
+    stamp = message.modified.timestamp() if message.modified else ''
+    return (f"mymessages:row:{ROW_CACHE_VERSION}:{template_name}:{message.pk}:{stamp}"
+            f":{viewer_id if viewer_id is not None else ''}")
+
+
+@register.simple_tag(takes_context=True)
+def message_rows(context, messages, template_name, per_user=False):
+    row_template = context.template.engine.get_template(template_name)
+    request = context.get('request')
+    timeout = settings.MESSAGE_ROW_CACHE_TIMEOUT
+
+    def render(message):
+        return row_template.render(template.Context(
+            {'message': message, 'request': request}, autoescape=context.autoescape))
+
+    messages = list(messages)
+    if not timeout:
+        return mark_safe("".join(render(message) for message in messages))
+
+    viewer_id = request.user.pk if per_user and request is not None else None
+    keys = [row_cache_key(template_name, message, viewer_id) for message in messages]
+    cached = cache.get_many(keys)
+    missing = {}
+    rows = []
+    for key, message in zip(keys, messages):
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render(message)
+        rows.append(html)
+    if missing:
+        cache.set_many(missing, timeout)
+    return mark_safe("".join(rows))
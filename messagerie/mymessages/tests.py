@@ -1,8 +1,54 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import zlib
+import tempfile
+import threading
+import time
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.paginator import Paginator
+from unittest import mock, skipUnless
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User, Permission
 from django.contrib.contenttypes.models import ContentType
-from django.urls import reverse
-from .models import Message
+from django.core.files.base import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.template import engines
+from django.template.loaders import cached
+from django.db.models import Count, Max, Q
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from . import autocomplete, deletion, jobs, metrics, realtime, reports, seeding, stats, summary, views
+from .inbox import InboxQuery
+from .jobs import claim_next_job, process_pending_jobs
+from .management.commands import apply_migrations
+from .middleware import (
+    REPLICA_PIN_SESSION_KEY, MetricsMiddleware, ReplicaRoutingMiddleware,
+    RequestMetricsMiddleware)
+from .models import ImportJob, Message, SeedMarker
+from .pagination import after_cursor, encode_cursor
+from .routers import replica_reads
+from .templatetags import message_tags
+from .services import MessageImportService, OrmBatchWriter, PostgresCopyWriter
+
+
+# Cache partagé entre processus : version de la boîte lue dans le résumé
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(),
+}}
 
 
 class AccessControlTest(TestCase):
@@ -107,6 +153,168 @@ class MessageOwnershipTest(TestCase):
         self.assertFalse(Message.objects.filter(pk=self.message.pk).exists())
 
 
+@override_settings(CACHES=SHARED_CACHES)
+class MessageObjectQueriesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        perms = Permission.objects.filter(codename__in=['change_message', 'delete_message'])
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.owner.user_permissions.set(perms)
+        self.recipient = User.objects.create_user(username='recipient', password='password')
+        self.other = User.objects.create_user(username='other', password='password')
+        self.message = Message.objects.create(
+            contenu="Secret", owner=self.owner, recipient=self.recipient)
+
+    def get_counting(self, url):
+        """Réponse et requêtes SQL (lecture des messages, des utilisateurs) de ``url``."""
+        self.client.get(url)  # remplit le résumé de boîte mis en cache
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        sql = [query['sql'] for query in ctx.captured_queries]
+        return response, {
+            'messages': [q for q in sql if q.startswith('SELECT') and 'FROM "mymessages_message"' in q],
+            'users': [q for q in sql if 'FROM "auth_user"' in q],
+        }
+
+    def test_update_and_delete_fetch_message_once(self):
+        """Une seule lecture du message ; propriétaire comparé par owner_id"""
+        self.client.login(username='owner', password='password')
+        for name in ('message_update', 'message_delete'):
+            response, queries = self.get_counting(reverse(name, args=[self.message.pk]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(queries['messages']), 1, name)
+            # L'utilisateur connecté ; plus le destinataire affiché par le formulaire
+            self.assertEqual(len(queries['users']), 2 if name == 'message_update' else 1, name)
+
+    def test_detail_scoped_in_one_query(self):
+        """Détail visible du propriétaire et du destinataire seulement, en une requête"""
+        url = reverse('message_detail', args=[self.message.pk])
+        for username in ('owner', 'recipient'):
+            self.client.login(username=username, password='password')
+            response, queries = self.get_counting(url)
+            self.assertContains(response, "Secret")
+            self.assertEqual(len(queries['messages']), 1)
+            self.assertEqual(len(queries['users']), 1)
+
+        self.client.login(username='other', password='password')
+        response, queries = self.get_counting(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(queries['messages']), 1)
+
+    def test_other_user_forbidden(self):
+        self.other.user_permissions.set(self.owner.user_permissions.all())
+        self.client.login(username='other', password='password')
+        response = self.client.post(reverse('message_delete', args=[self.message.pk]))
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(Message.objects.filter(pk=self.message.pk).exists())
+
+
+class MessageAdminTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', password='password', email='admin@test.com')
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(5)]
+        Message.objects.bulk_create(
+            Message(contenu=f"Msg {i}", owner=self.users[i % 5],
+                    recipient=self.users[(i + 1) % 5]) for i in range(30))
+        stats.rebuild()
+        self.client.login(username='admin', password='password')
+
+    # Table jamais analysée : sur PostgreSQL, une estimation de 30 lignes
+    # (sous exact_below) donnerait un COUNT(*) exact
+    @mock.patch('mymessages.pagination.estimated_table_count', return_value=None)
+    def test_changelist_without_full_count(self, estimate):
+        """Liste admin : jointure des utilisateurs, total sans COUNT(*) de la table"""
+        url = reverse('admin:mymessages_message_changelist')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 30)
+        message_queries = [q['sql'] for q in ctx.captured_queries
+                           if 'FROM "mymessages_message"' in q['sql']]
+        self.assertFalse([sql for sql in message_queries if 'COUNT(' in sql])
+        # Aucune requête par ligne : le nombre ne dépend pas des messages affichés
+        Message.objects.bulk_create(
+            Message(contenu=f"Autre {i}", owner=self.users[0]) for i in range(20))
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            self.client.get(url)
+
+        # Liste filtrée (navigation par date) : total exact
+        today = timezone.now()
+        response = self.client.get(url, {
+            'date_envoi__year': today.year, 'date_envoi__month': today.month})
+        self.assertEqual(response.context['cl'].result_count, 50)
+
+    def test_user_fields_use_autocomplete(self):
+        response = self.client.get(reverse('admin:mymessages_message_add'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, '>user3</option>')
+
+
+class RecipientAutocompleteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.alice.user_permissions.add(*Permission.objects.filter(
+            codename__in=['add_message', 'change_message']))
+        User.objects.bulk_create(
+            [User(username=f"bob{i:02d}") for i in range(25)]
+            + [User(username="Bobby"), User(username="carol")])
+        self.client.login(username='alice', password='password')
+
+    def test_prefix_pages(self):
+        """Préfixe insensible à la casse, pages de 20 par ordre de nom"""
+        url = reverse('user_autocomplete')
+        page = self.client.get(url, {'q': 'BOB'}).json()
+        self.assertEqual([user['username'] for user in page['results']],
+                         [f"bob{i:02d}" for i in range(20)])
+        self.assertEqual(page['next'], 'bob19')
+        page = self.client.get(url, {'q': 'BOB', 'after': page['next']}).json()
+        self.assertEqual([user['username'] for user in page['results']],
+                         [f"bob{i:02d}" for i in range(20, 25)] + ["Bobby"])
+        self.assertIsNone(page['next'])
+
+        # Page gardée en cache : aucune requête pour le même préfixe
+        with self.assertNumQueries(0):
+            autocomplete.search_users('BOB')
+
+    def test_same_name_in_other_case(self):
+        """Deux noms égaux aux majuscules près : départagés, aucun n'est sauté"""
+        User.objects.create_user(username='BOBBY')
+        first = autocomplete.search_users('bobby', limit=1)
+        self.assertEqual([user['username'] for user in first['results']], ['BOBBY'])
+        second = autocomplete.search_users('bobby', after=first['next'], limit=1)
+        self.assertEqual([user['username'] for user in second['results']], ['Bobby'])
+        self.assertIsNone(second['next'])
+
+    @skipUnless(connection.vendor == 'sqlite', "Plans d'exécution propres à SQLite")
+    def test_prefix_uses_upper_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            autocomplete.search_users('bo', after='bob03')
+        plan = connection.cursor().execute(
+            f"EXPLAIN QUERY PLAN {ctx.captured_queries[-1]['sql']}").fetchall()
+        self.assertIn('auth_user_username_upper_idx', str(plan))
+        self.assertNotIn('TEMP B-TREE', str(plan))
+
+    def test_form_does_not_list_users(self):
+        """Le formulaire ne rend que l'option sélectionnée"""
+        response = self.client.get(reverse('message_create'))
+        self.assertContains(response, 'data-autocomplete-url="%s"' % reverse('user_autocomplete'))
+        self.assertContains(response, 'js/user_autocomplete.js')
+        self.assertNotContains(response, '>carol</option>')
+
+        carol = User.objects.get(username='carol')
+        response = self.client.post(reverse('message_create'), {
+            'contenu': "Salut", 'recipient': carol.pk})
+        self.assertEqual(response.status_code, 302)
+        message = Message.objects.get(contenu="Salut")
+        self.assertEqual(message.recipient, carol)
+
+        response = self.client.get(reverse('message_update', args=[message.pk]))
+        self.assertContains(response, f'<option value="{carol.pk}" selected>carol</option>')
+        self.assertNotContains(response, '>Bobby</option>')
+
+
 class MessageListViewTest(TestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
@@ -141,6 +349,155 @@ class MessageListViewTest(TestCase):
         self.assertContains(response, "Hello U1 from U2")
 
 
+@override_settings(CACHES=SHARED_CACHES)
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.message = Message.objects.create(
+            contenu="Bonjour Bob", owner=self.alice, recipient=self.bob)
+        self.client.login(username='bob', password='password')
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified_skips_query_and_rendering(self):
+        """Un ETag à jour donne un 304 sans lire les messages"""
+        url = reverse('message_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        # Une suppression ne ferait pas avancer de date
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            revalidated = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+        self.assertFalse([query for query in ctx.captured_queries
+                          if 'mymessages_message' in query['sql']])
+
+    def test_writes_change_etag(self):
+        """Réception, modification et suppression changent la version de la boîte"""
+        url = reverse('message_detail', args=[self.message.pk])
+        response = self.client.get(url)
+
+        def write(action):
+            nonlocal response
+            action()
+            revalidated = self.revalidate(url, response)
+            self.assertEqual(revalidated.status_code, 200)
+            self.assertNotEqual(revalidated['ETag'], response['ETag'])
+            response = revalidated
+
+        write(lambda: Message.objects.create(contenu="Encore", owner=self.alice, recipient=self.bob))
+        self.message.contenu = "Bonjour Bob, modifié"
+        write(self.message.save)
+        self.assertContains(response, "Bonjour Bob, modifié")
+        write(Message.objects.exclude(pk=self.message.pk).delete)
+        # Une écriture hors de la boîte ne change rien
+        Message.objects.create(contenu="Ailleurs", owner=self.alice)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    def test_etag_depends_on_session(self):
+        """Une reconnexion (nouveau jeton CSRF) redonne une page complète"""
+        url = reverse('message_list')
+        response = self.client.get(url)
+        self.client.logout()
+        self.client.login(username='bob', password='password')
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'autre-jeton'
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_cache_reads_version_from_database(self):
+        """Cache propre au processus : la version est relue en base à chaque fois"""
+        url = reverse('message_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        # Écriture d'un autre worker : le cache de ce processus n'est pas invalidé
+        with mock.patch.object(summary, 'invalidate'):
+            Message.objects.create(contenu="Autre worker", owner=self.alice, recipient=self.bob)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_superuser_detail_is_not_validated(self):
+        User.objects.create_superuser(username='admin', password='password')
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse('message_detail', args=[self.message.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_sync_view(self):
+        """Variante synchrone (MESSAGE_ASYNC_VIEWS=0)"""
+        def get(**headers):
+            request = RequestFactory().get('/messages/', headers=headers)
+            request.user = self.bob
+            request.META['CSRF_COOKIE'] = 'a' * 32
+            return views.MessageListView.as_view()(request)
+
+        response = get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get(if_none_match=response['ETag']).status_code, 304)
+
+    async def test_async_view(self):
+        await self.async_client.alogin(username='bob', password='password')
+        url = reverse('message_list')
+        response = await self.async_client.get(url)
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class MessageRowCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.message = Message.objects.create(
+            contenu="Bonjour Bob", owner=self.alice, recipient=self.bob)
+
+    def row_key(self, user):
+        return message_tags.row_cache_key('message_row.html', self.message, user.pk)
+
+    def test_rows_are_cached_until_modified(self):
+        """La ligne est reprise du cache tant que le message n'a pas changé"""
+        self.client.login(username='alice', password='password')
+        self.client.get(reverse('message_list'))
+        self.assertIn("Bonjour Bob", cache.get(self.row_key(self.alice)))
+
+        # Le HTML en cache est servi tel quel
+        cache.set(self.row_key(self.alice), "Ligne en cache")
+        self.assertContains(self.client.get(reverse('message_list')), "Ligne en cache")
+
+        # Une modification change la clé : la ligne est rendue à nouveau
+        self.message.contenu = "Bonjour Bob, modifié"
+        self.message.save()
+        response = self.client.get(reverse('message_list'))
+        self.assertContains(response, "Bonjour Bob, modifié")
+        self.assertNotContains(response, "Ligne en cache")
+
+    def test_rows_depend_on_viewer(self):
+        """L'expéditeur et le destinataire ont chacun leur version de la ligne"""
+        self.client.login(username='alice', password='password')
+        self.assertContains(self.client.get(reverse('message_list')), "À : bob")
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse('message_list'))
+        self.assertNotContains(response, "À : bob")
+        self.assertContains(response, "alice")
+
+    @override_settings(MESSAGE_ROW_CACHE_TIMEOUT=0)
+    def test_zero_timeout_disables_cache(self):
+        self.client.login(username='alice', password='password')
+        self.assertContains(self.client.get(reverse('message_list')), "Bonjour Bob")
+        self.assertIsNone(cache.get(self.row_key(self.alice)))
+
+    def test_templates_are_compiled_once(self):
+        """Le chargeur en cache de Django reste actif (pas de 'loaders' explicites)"""
+        loader = engines.all()[0].engine.template_loaders[0]
+        self.assertIsInstance(loader, cached.Loader)
+
+
 class BulkDeleteTest(TestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
@@ -192,3 +549,1260 @@ class BulkDeleteTest(TestCase):
         self.assertFalse(Message.objects.filter(pk=self.msg1_u1.pk).exists())
         # Celui de l'autre reste
         self.assertTrue(Message.objects.filter(pk=self.msg1_u2.pk).exists())
+
+    def test_bulk_delete_all_matching_search(self):
+        """« Tout supprimer » sur une recherche, sans envoyer d'identifiants."""
+        Message.objects.create(contenu="Autre sujet", owner=self.user1)
+        self.client.login(username='user1', password='password')
+
+        self.client.post(reverse('message_bulk_delete'), {
+            'q': 'Msg', 'all_matching': '1'})
+
+        self.assertEqual(
+            list(Message.objects.order_by('pk').values_list('contenu', flat=True)),
+            ["Msg 1 User 2", "Autre sujet"])
+
+    def test_chunked_delete_updates_counters(self):
+        """Suppression par lots : requêtes bornées par lot, compteurs à jour."""
+        Message.objects.bulk_create(
+            Message(contenu=f"Lot {i}", owner=self.user1, recipient=self.user2)
+            for i in range(25))
+        stats.rebuild()
+
+        # Par lot : savepoint, lecture des clés, DELETE, révision, compteur
+        # du jour, compteur du propriétaire, libération ; puis un lot vide.
+        with self.assertNumQueries(7 * 3 + 3):
+            deleted = deletion.delete_messages(
+                Message.objects.filter(owner=self.user1), chunk_size=10)
+
+        self.assertEqual(deleted, 27)
+        self.assertEqual(stats.user_stats().get(owner__username='user2')['count'], 1)
+        self.assertFalse(stats.user_stats().filter(owner__username='user1').exists())
+        self.assertEqual(summary.get_summary(self.user2)['received'], 0)
+
+
+class MessageImportServiceTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+
+    def _csv(self, content):
+        return SimpleUploadedFile('messages.csv', content.encode('utf-8'))
+
+    def test_import_rows_and_errors(self):
+        """Les lignes valides sont importées, les autres détaillées dans errors"""
+        csv_file = self._csv(
+            "contenu,date_created,author_username\n"
+            "Bonjour,2023-11-01 08:00:00,alice,bob\n"
+            "\n"
+            "Inconnu,2023-11-01 09:00:00,nobody\n"
+            "Mauvaise date,pas-une-date,alice\n"
+            "Incomplet\n"
+            "Réponse,2023-11-01 10:00:00,bob\n"
+        )
+        service = MessageImportService(batch_size=2)
+        success_count, error_count = service.import_csv(csv_file)
+
+        self.assertEqual((success_count, error_count), (2, 4))
+        self.assertEqual([error.line for error in service.errors], [1, 4, 5, 6])
+
+        message = Message.objects.get(contenu="Bonjour")
+        self.assertEqual(message.owner, self.alice)
+        self.assertEqual(message.recipient, self.bob)
+        self.assertIsNotNone(message.date_envoi.tzinfo)
+        self.assertTrue(Message.objects.filter(
+            contenu="Réponse", owner=self.bob, recipient=None).exists())
+
+    def test_stored_errors_are_capped(self):
+        """Au-delà de max_errors, les rejets sont comptés sans être gardés"""
+        service = MessageImportService(batch_size=2, max_errors=3)
+        success_count, error_count = service.import_csv(self._csv("".join(
+            f"Rejet {i},2023-11-01 08:00:00,nobody\n" for i in range(7))))
+        self.assertEqual((success_count, error_count), (0, 7))
+        self.assertEqual([error.line for error in service.errors], [1, 2, 3])
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Le nombre de requêtes dépend du nombre de lots, pas de lignes"""
+        def count_queries(rows):
+            content = "".join(
+                f"Msg {i},2023-11-01 08:00:00,alice,bob\n" for i in range(rows))
+            with CaptureQueriesContext(connection) as ctx:
+                MessageImportService(batch_size=100).import_csv(
+                    self._csv(content))
+            return len(ctx.captured_queries)
+
+        # Premier import : crée les lignes de statistiques du jour
+        count_queries(1)
+        self.assertEqual(count_queries(2), count_queries(50))
+        self.assertEqual(Message.objects.count(), 53)
+
+    def test_copy_backend_falls_back_to_orm(self):
+        """Le backend COPY n'est utilisé que sur PostgreSQL avec psycopg 3"""
+        service = MessageImportService(backend='copy')
+        if connection.vendor != 'postgresql':
+            self.assertIsInstance(service.get_writer(), OrmBatchWriter)
+        success_count, error_count = service.import_csv(self._csv(
+            "Bonjour,2023-11-01 08:00:00,alice,bob\n"
+            "Inconnu,2023-11-01 09:00:00,nobody\n"))
+        self.assertEqual((success_count, error_count), (1, 1))
+        self.assertEqual(service.errors[0].line, 2)
+        self.assertTrue(Message.objects.filter(
+            owner=self.alice, recipient=self.bob).exists())
+
+    @skipUnless(connection.vendor == 'postgresql' and PostgresCopyWriter.is_available(),
+                "COPY propre à PostgreSQL avec psycopg 3")
+    def test_copy_backend_batches_in_outer_transaction(self):
+        """Plusieurs lots dans la transaction du test : aucun lot réinséré"""
+        service = MessageImportService(batch_size=2, backend='copy')
+        self.assertIsInstance(service.get_writer(), PostgresCopyWriter)
+        success_count, error_count = service.import_csv(self._csv("".join(
+            f"Message {i},2023-11-01 08:00:00,alice,bob\n" for i in range(5))))
+        self.assertEqual((success_count, error_count), (5, 0))
+        self.assertEqual(sorted(Message.objects.values_list('contenu', flat=True)),
+                         [f"Message {i}" for i in range(5)])
+
+
+class ImportJobTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+
+    def _upload(self, content):
+        return self.client.post(reverse('message_import'), {
+            'csv_file': SimpleUploadedFile('messages.csv', content.encode('utf-8'))})
+
+    def test_upload_is_queued_then_processed_by_worker(self):
+        """Le téléversement crée un job, le worker l'exécute ensuite"""
+        self.client.login(username='alice', password='password')
+        response = self._upload(
+            "Salut,2023-11-01 08:00:00,alice,bob\nErreur,2023-11-01,nobody\n")
+        self.assertRedirects(response, reverse('message_import'))
+
+        job = ImportJob.objects.get(owner=self.alice)
+        self.assertEqual(job.status, ImportJob.PENDING)
+        self.assertEqual(Message.objects.count(), 0)
+
+        call_command('process_import_jobs', once=True, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual((job.success_count, job.error_count), (1, 1))
+        self.assertEqual(job.errors[0][0], 2)
+        self.assertTrue(Message.objects.filter(
+            contenu="Salut", owner=self.alice, recipient=self.bob).exists())
+
+    def test_csv_is_stored_in_database(self):
+        """Le CSV est gardé en base, par morceaux, et lu en flux par le worker"""
+        content = ("Premier message,2023-11-01 08:00:00,alice,bob\n"
+                   "Deuxième message,2023-11-01 09:00:00,bob,alice\n").encode('utf-8')
+        with mock.patch.object(jobs, 'CSV_CHUNK_SIZE', 16):
+            job = jobs.create_job(self.alice, File(io.BytesIO(content)))
+            self.assertFalse(job.csv_file)
+            self.assertGreater(job.chunks.count(), 4)
+            process_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.success_count), (ImportJob.DONE, 2))
+        self.assertEqual(sorted(Message.objects.values_list('contenu', flat=True)),
+                         ["Deuxième message", "Premier message"])
+        self.assertFalse(job.chunks.exists())
+
+    def test_job_with_media_file(self):
+        """Un job créé avant le stockage en base lit encore son fichier"""
+        job = ImportJob.objects.create(owner=self.alice, csv_file=SimpleUploadedFile(
+            'messages.csv', b"Salut,2023-11-01 08:00:00,alice\n"))
+        path = job.csv_file.path
+        process_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.success_count), (ImportJob.DONE, 1))
+        self.assertFalse(os.path.exists(path))
+
+    def test_status_endpoint(self):
+        """La progression est exposée en JSON, uniquement au propriétaire"""
+        self.client.login(username='alice', password='password')
+        self._upload("Salut,2023-11-01 08:00:00,alice\n")
+        job = ImportJob.objects.get(owner=self.alice)
+        process_pending_jobs()
+
+        response = self.client.get(reverse('import_job_status', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], ImportJob.DONE)
+        self.assertTrue(data['finished'])
+        self.assertEqual(data['success_count'], 1)
+
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse('import_job_status', args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        """Un job réservé n'est plus proposé aux autres workers"""
+        self.client.login(username='alice', password='password')
+        self._upload("Salut,2023-11-01 08:00:00,alice\n")
+        self.assertIsNotNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+    def _failing_job(self, exc):
+        """Job de quatre lignes (une par lot), la première rejetée, dont le troisième lot lève ``exc``"""
+        self.client.login(username='alice', password='password')
+        self._upload("Zéro,2023-11-01 07:00:00,inconnu\n"
+                     "Un,2023-11-01 08:00:00,alice\n"
+                     "Deux,2023-11-01 09:00:00,alice\n"
+                     "Trois,2023-11-01 10:00:00,alice\n")
+        write = OrmBatchWriter.write
+        calls = []
+
+        def flaky_write(writer, rows):
+            calls.append(rows)
+            if len(calls) == 3:
+                raise exc
+            return write(writer, rows)
+
+        return (mock.patch.object(MessageImportService, 'batch_size', 1),
+                mock.patch.object(OrmBatchWriter, 'write', flaky_write))
+
+    def test_failure_keeps_committed_progress(self):
+        """Un échec n'efface ni les compteurs ni les rejets des lots déjà importés"""
+        batch_size, flaky = self._failing_job(RuntimeError("disque plein"))
+        with batch_size, flaky:
+            process_pending_jobs()
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertEqual((job.success_count, job.error_count, job.last_line), (1, 1, 2))
+        self.assertEqual(job.errors, [[1, "Utilisateur inconnu : inconnu"], [None, "disque plein"]])
+        self.assertEqual(list(Message.objects.values_list('contenu', flat=True)), ["Un"])
+        # Fichier gardé : relancé depuis l'admin, le job reprend après la ligne 2
+        self.assertTrue(job.chunks.exists())
+        admin_user = User.objects.create_superuser('admin', 'admin@test.com', 'password')
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:mymessages_importjob_changelist'), {
+            'action': 'retry', '_selected_action': [job.pk]})
+        self.assertEqual(process_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.success_count, job.error_count), (ImportJob.DONE, 3, 1))
+        self.assertFalse(job.chunks.exists())
+        self.assertEqual(Message.objects.count(), 3)
+
+    def test_stale_running_job_is_resumed(self):
+        """Le job d'un worker arrêté est repris après sa dernière ligne validée"""
+        batch_size, flaky = self._failing_job(KeyboardInterrupt())
+        with batch_size, flaky, self.assertRaises(KeyboardInterrupt):
+            process_pending_jobs()
+        job = ImportJob.objects.get()
+        self.assertEqual((job.status, job.last_line), (ImportJob.RUNNING, 2))
+        # Encore récent : aucun autre worker ne le prend
+        self.assertIsNone(claim_next_job())
+
+        ImportJob.objects.update(heartbeat=timezone.now() - datetime.timedelta(
+            seconds=jobs.STALE_JOB_TIMEOUT + 1))
+        self.assertEqual(process_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual((job.success_count, job.error_count), (3, 1))
+        # Rejet relevé par le worker précédent
+        self.assertEqual(job.errors, [[1, "Utilisateur inconnu : inconnu"]])
+        self.assertEqual(sorted(Message.objects.values_list('contenu', flat=True)),
+                         ["Deux", "Trois", "Un"])
+
+
+class ExportMessagesPdfTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='exporter', password='password')
+        Message.objects.bulk_create(
+            Message(contenu=f"Message n°{i} (été)", owner=self.user)
+            for i in range(100))
+
+    def test_pdf_is_streamed_page_by_page(self):
+        """L'export est envoyé en flux et forme un PDF valide"""
+        self.client.login(username='exporter', password='password')
+        response = self.client.get(reverse('export_messages_pdf'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        # En-tête, une page de ~35 lignes par morceau, puis la fin du document
+        self.assertGreater(len(chunks), 4)
+        pdf = b"".join(chunks)
+        self.assertTrue(pdf.startswith(b"%PDF-1.4"))
+        self.assertTrue(pdf.endswith(b"%%EOF\n"))
+
+        # Chaque entrée de la table xref pointe sur le bon objet
+        xref = int(pdf.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+        entries = pdf[xref:].split(b"\n")[3:]
+        for number, entry in enumerate(entries, start=1):
+            if entry.startswith(b"trailer"):
+                break
+            offset = int(entry[:10])
+            self.assertTrue(pdf[offset:].startswith(b"%d 0 obj" % number))
+
+        text = b"".join(
+            zlib.decompress(stream.split(b"stream\n", 1)[1])
+            for stream in pdf.split(b"\nendstream")[:-1])
+        self.assertIn("Message n°0 \\(été\\)) Tj".encode('cp1252'), text)
+        self.assertIn(b"/Count 3", pdf)
+
+
+class ExportMessagesTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        day = timezone.make_aware(datetime.datetime(2024, 1, 1, 10, 0, 0, 123456))
+        Message.objects.create(contenu='Bonjour, "Bob"\nligne 2', owner=self.alice,
+                               recipient=self.bob, date_envoi=day)
+        Message.objects.create(contenu="Sans destinataire", owner=self.alice,
+                               date_envoi=day + datetime.timedelta(days=1))
+        Message.objects.create(contenu="Réponse", owner=self.bob, recipient=self.alice,
+                               date_envoi=day + datetime.timedelta(days=2))
+        Message.objects.create(contenu="Privé", owner=self.bob,
+                               date_envoi=day + datetime.timedelta(days=3))
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse('export_messages', args=[export_format]), params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_round_trips_with_import(self):
+        """Un export CSV se réimporte à l'identique"""
+        self.client.login(username='alice', password='password')
+        exported = self.export('csv')
+        before = list(Message.objects.filter(contenu__in=[
+            'Bonjour, "Bob"\nligne 2', "Sans destinataire", "Réponse"]).order_by(
+            'date_envoi').values_list('contenu', 'date_envoi', 'owner', 'recipient'))
+
+        Message.objects.all().delete()
+        service = MessageImportService()
+        self.assertEqual(service.import_csv(io.BytesIO(exported.encode())), (3, 0))
+        after = list(Message.objects.order_by('date_envoi').values_list(
+            'contenu', 'date_envoi', 'owner', 'recipient'))
+        self.assertEqual(after, before)
+
+    def test_ndjson_filters_and_scope(self):
+        """Filtres par date, propriétaire et destinataire ; messages d'autrui exclus"""
+        self.client.login(username='alice', password='password')
+        lines = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        # Le message privé de Bob n'est pas visible d'Alice
+        self.assertEqual([line['contenu'] for line in lines],
+                         ['Bonjour, "Bob"\nligne 2', "Sans destinataire", "Réponse"])
+        self.assertEqual(lines[0]['recipient'], 'bob')
+
+        filtered = self.export('ndjson', since='2024-01-02', until='2024-01-03')
+        self.assertEqual([json.loads(line)['contenu'] for line in filtered.splitlines()],
+                         ["Sans destinataire", "Réponse"])
+        self.assertEqual(len(self.export('ndjson', owner='bob').splitlines()), 1)
+        self.assertEqual(len(self.export('ndjson', recipient='bob').splitlines()), 1)
+
+    def test_invalid_requests(self):
+        self.client.login(username='alice', password='password')
+        url = reverse('export_messages', args=['csv'])
+        self.assertEqual(self.client.get(url, {'since': 'hier'}).status_code, 400)
+        self.assertEqual(self.client.get(
+            reverse('export_messages', args=['pdf'])).status_code, 404)
+
+
+class StatsReportCacheTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(REPORT_CACHE_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='alice', password='password')
+        self.message = Message.objects.create(contenu="A", owner=self.user)
+        self.client.login(username='alice', password='password')
+
+    def get_report(self, **headers):
+        response = self.client.get(reverse('export_stats_pdf'), headers=headers)
+        if response.status_code == 200:
+            self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        return response
+
+    def test_report_is_generated_once_per_version(self):
+        """Le PDF n'est régénéré que si les statistiques ont changé"""
+        first = self.get_report()
+        self.assertEqual(first['X-Cache'], 'MISS')
+        etag = first['ETag']
+
+        second = self.get_report()
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second['ETag'], etag)
+        self.assertEqual(self.get_report(If_None_Match=etag).status_code, 304)
+
+        # Une création puis une suppression changent chacune la version
+        other = Message.objects.create(contenu="B", owner=self.user)
+        created = self.get_report(If_None_Match=etag)
+        self.assertEqual(created.status_code, 200)
+        self.assertEqual(created['X-Cache'], 'MISS')
+        self.assertNotEqual(created['ETag'], etag)
+
+        other.delete()
+        deleted = self.get_report()
+        self.assertEqual(deleted['X-Cache'], 'MISS')
+        self.assertNotIn(deleted['ETag'], (etag, created['ETag']))
+
+    def test_move_changes_version(self):
+        """Changer le propriétaire d'un message change la version"""
+        version = stats.version()
+        self.message.owner = User.objects.create_user(username='bob')
+        self.message.save()
+        self.assertNotEqual(stats.version(), version)
+
+    def test_eviction_by_age_and_size(self):
+        """Les fichiers trop vieux, puis les moins récemment servis, sont supprimés"""
+        report_cache = reports.ReportCache(self.tmp.name, max_bytes=250, max_age=60)
+        for key, age in (('a', 30), ('b', 20)):
+            report_cache.put(key, b"x" * 100)
+            past = time.time() - age
+            os.utime(report_cache.path(key), (past, past))
+        report_cache.get('a').close()
+        # 300 octets > 250 : « b » est désormais le moins récemment servi
+        report_cache.put('c', b"x" * 100)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['a.pdf', 'c.pdf'])
+
+        old = time.time() - 120
+        os.utime(report_cache.path('c'), (old, old))
+        self.assertIsNone(report_cache.get('c'))
+        self.assertEqual(os.listdir(self.tmp.name), ['a.pdf'])
+        self.assertEqual((report_cache.hits, report_cache.misses), (1, 1))
+
+    def test_written_report_is_never_evicted(self):
+        """Un rapport plus gros que la limite reste servi ; un fichier ouvert survit à l'éviction"""
+        report_cache = reports.ReportCache(self.tmp.name, max_bytes=50, max_age=60)
+        report_cache.put('a', b"x" * 100)
+        self.assertEqual(os.listdir(self.tmp.name), ['a.pdf'])
+
+        with report_cache.get('a') as file:
+            report_cache.put('b', b"y" * 100)
+            self.assertEqual(os.listdir(self.tmp.name), ['b.pdf'])
+            self.assertEqual(file.read(), b"x" * 100)
+
+        with override_settings(REPORT_CACHE_MAX_BYTES=1):
+            self.assertEqual(self.get_report()['X-Cache'], 'MISS')
+            self.assertEqual(self.get_report()['X-Cache'], 'HIT')
+
+
+class MessageStatsTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+        self.day1 = timezone.make_aware(datetime.datetime(2024, 1, 1, 10, 0))
+        self.day2 = timezone.make_aware(datetime.datetime(2024, 1, 2, 10, 0))
+
+    def assertStats(self, daily, users):
+        self.assertEqual(
+            [(stat['date'], stat['count']) for stat in stats.daily_stats()], daily)
+        self.assertEqual(
+            sorted(((stat['owner__username'], stat['count']) for stat in stats.user_stats()), key=str),
+            sorted(users, key=str))
+
+    def test_counters_follow_writes(self):
+        """Création, modification et suppression mettent à jour les compteurs"""
+        msg = Message.objects.create(contenu="A", owner=self.alice, date_envoi=self.day1)
+        Message.objects.create(contenu="B", owner=self.alice, date_envoi=self.day1)
+        Message.objects.create(contenu="C", date_envoi=self.day2)
+        self.assertStats(
+            [(self.day1.date(), 2), (self.day2.date(), 1)],
+            [('alice', 2), (None, 1)])
+
+        msg.owner = self.bob
+        msg.date_envoi = self.day2
+        msg.save()
+        self.assertStats(
+            [(self.day1.date(), 1), (self.day2.date(), 2)],
+            [('alice', 1), ('bob', 1), (None, 1)])
+
+        msg.delete()
+        self.assertStats(
+            [(self.day1.date(), 1), (self.day2.date(), 1)],
+            [('alice', 1), (None, 1)])
+
+    def test_user_deletion(self):
+        """Supprimer un utilisateur ne recrée pas son compteur (clé étrangère orpheline)"""
+        Message.objects.create(contenu="A", owner=self.alice, date_envoi=self.day1)
+        Message.objects.create(contenu="B", owner=self.alice, date_envoi=self.day2)
+        Message.objects.create(contenu="C", owner=self.bob, date_envoi=self.day2)
+        self.alice.delete()
+        connection.check_constraints()
+        self.assertStats([(self.day2.date(), 1)], [('bob', 1)])
+
+    def test_bulk_paths_and_rebuild(self):
+        """L'import et la suppression groupée mettent à jour les compteurs"""
+        MessageImportService().import_csv(SimpleUploadedFile('m.csv', (
+            "A,2024-01-01 10:00:00,alice\n"
+            "B,2024-01-01 11:00:00,alice\n"
+            "C,2024-01-02 10:00:00,bob\n").encode('utf-8')))
+        self.assertStats(
+            [(self.day1.date(), 2), (self.day2.date(), 1)],
+            [('alice', 2), ('bob', 1)])
+
+        self.client.login(username='alice', password='password')
+        self.client.post(reverse('message_bulk_delete'), {
+            'message_ids': list(Message.objects.filter(
+                owner=self.alice).values_list('pk', flat=True))})
+        self.assertStats([(self.day2.date(), 1)], [('bob', 1)])
+
+        call_command('rebuild_message_stats', stdout=io.StringIO())
+        self.assertStats([(self.day2.date(), 1)], [('bob', 1)])
+
+    def test_dashboard_reads_counters(self):
+        """Le tableau de bord n'agrège plus la table des messages"""
+        Message.objects.create(contenu="A", owner=self.alice, date_envoi=self.day1)
+        User.objects.create_superuser(
+            username='admin', password='password', email='admin@test.com')
+        self.client.login(username='admin', password='password')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['chart_data'], '[1]')
+        self.assertEqual(response.context['user_labels'], '["alice"]')
+        self.assertFalse([query for query in ctx.captured_queries
+                          if 'GROUP BY' in query['sql'] and 'mymessages_message"' in query['sql']])
+
+
+class SeedMessagesCommandTest(TestCase):
+    def seed(self, **options):
+        out = io.StringIO()
+        call_command('seed_messages', users=5, messages=200, stdout=out, **options)
+        return out.getvalue()
+
+    def dataset(self):
+        return list(Message.objects.order_by('id').values_list(
+            'contenu', 'owner__username', 'recipient__username', 'date_envoi'))
+
+    def test_seed_is_reproducible(self):
+        """Même graine, même jeu, dates comprises ; le plus actif est bench_0"""
+        self.assertIn("Jeu généré", self.seed())
+        first = self.dataset()
+        self.assertEqual(len(first), 200)
+        self.assertEqual(sum(stat['count'] for stat in stats.user_stats()), 200)
+        counts = Counter(owner for _, owner, _, _ in first)
+        self.assertEqual(counts.most_common(1)[0][0], 'bench_0')
+        self.assertLess(max(date for *_, date in first), seeding.EPOCH)
+
+        self.assertIn("déjà en place", self.seed())
+        # Autre jour, autre découpage en lots : même jeu
+        with mock.patch('django.utils.timezone.now',
+                        return_value=timezone.now() + datetime.timedelta(days=3)):
+            self.seed(force=True, batch_size=7)
+        self.assertEqual(self.dataset(), first)
+
+    def test_marker_records_seed_and_size(self):
+        """Une autre graine, ou un jeu interrompu, est regénéré"""
+        self.seed()
+        marker = SeedMarker.objects.get()
+        self.assertEqual((marker.seed, marker.users, marker.messages), (42, 5, 200))
+        first = self.dataset()
+
+        self.assertIn("Jeu généré", self.seed(seed=7))
+        self.assertNotEqual(self.dataset(), first)
+        self.assertEqual(SeedMarker.objects.get().seed, 7)
+
+        # Mêmes comptages, mais sans marqueur : génération interrompue
+        SeedMarker.objects.all().delete()
+        self.assertIn("Jeu généré", self.seed(seed=7))
+
+    def test_refuses_foreign_messages(self):
+        """Des messages d'autres utilisateurs ne sont supprimés qu'avec --force"""
+        alice = User.objects.create_user(username='alice', password='password')
+        Message.objects.create(contenu="Message réel", owner=alice)
+        with self.assertRaisesMessage(CommandError, "--force"):
+            self.seed()
+        self.assertTrue(Message.objects.filter(owner=alice).exists())
+
+        self.seed(force=True)
+        self.assertFalse(Message.objects.filter(owner=alice).exists())
+        self.assertEqual(Message.objects.count(), 200)
+        # Seul le jeu synthétique est en place : un autre jeu le remplace sans --force
+        call_command('seed_messages', users=3, messages=50, stdout=io.StringIO())
+        self.assertEqual(Message.objects.count(), 50)
+
+
+class ApplyMigrationsCommandTest(TestCase):
+    def test_nothing_to_apply(self):
+        """Base à jour : la release n'appelle pas migrate"""
+        out = io.StringIO()
+        call_command('apply_migrations', stdout=out)
+        self.assertIn("Aucune migration à appliquer", out.getvalue())
+
+    @skipUnless(connection.vendor == 'postgresql', "Verrou consultatif PostgreSQL")
+    def test_lock_is_released(self):
+        call_command('apply_migrations', stdout=io.StringIO())
+        # Faux si la session ne détient plus le verrou
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [apply_migrations.LOCK_KEY])
+            self.assertFalse(cursor.fetchone()[0])
+
+
+class DashboardFeedTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', password='password', email='admin@test.com')
+        self.user = User.objects.create_user(
+            username='user', password='password')
+        # Plusieurs messages à la même date : le curseur départage par id
+        same_date = timezone.now()
+        Message.objects.bulk_create(
+            Message(contenu=f"Msg {i}", owner=self.user, recipient=self.admin,
+                    date_envoi=same_date - datetime.timedelta(minutes=i // 10))
+            for i in range(120))
+
+    def test_keyset_pages_cover_all_messages(self):
+        """Le fil est paginé par curseur, sans doublon ni oubli"""
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse('home'))
+        seen = [message.contenu for message in response.context['messages_liste']]
+        cursor = response.context['next_cursor']
+        self.assertEqual(len(seen), views.HOME_FEED_PAGE_SIZE)
+
+        while cursor:
+            with CaptureQueriesContext(connection) as ctx:
+                page = self.client.get(reverse('home_feed'), {'cursor': cursor}).json()
+            # Une seule requête sur les messages (jointure sur les utilisateurs)
+            self.assertEqual(len([query for query in ctx.captured_queries
+                                  if 'mymessages_message' in query['sql']]), 1)
+            seen.extend(re.findall(r'Msg \d+', page['html']))
+            cursor = page['next_cursor']
+
+        expected = list(Message.objects.order_by(
+            '-date_envoi', '-id').values_list('contenu', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_feed_access(self):
+        """Le fil est réservé aux superusers et rejette un curseur invalide"""
+        self.client.login(username='user', password='password')
+        self.assertEqual(self.client.get(reverse('home_feed')).status_code, 403)
+
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse('home_feed'), {'cursor': 'invalide'})
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Plans d'exécution propres à SQLite")
+class QueryPlanTest(TestCase):
+    """Les requêtes fréquentes doivent passer par un index, jamais par un
+    parcours complet de la table des messages."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='planner')
+
+    def plan(self, queryset):
+        return queryset.explain()
+
+    def assertIndexed(self, queryset, index=None, ordered=False):
+        plan = self.plan(queryset)
+        self.assertNotRegex(plan, r'SCAN mymessages_message(?! USING)', plan)
+        if index:
+            self.assertIn(f'USING INDEX {index}', plan)
+        if ordered:
+            # Le tri est fourni par l'index, sans passe de tri supplémentaire
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_message_list(self):
+        user = self.user
+        queryset = Message.objects.filter(Q(owner=user) | Q(recipient=user))
+        self.assertIndexed(queryset.order_by('-date_envoi')[:10])
+        self.assertRegex(self.plan(queryset), r'message_recipient_(date_id|modified)_idx')
+
+    def test_export_pdf(self):
+        self.assertIndexed(
+            Message.objects.filter(owner=self.user).order_by('-date_envoi').only(
+                'date_envoi', 'contenu'),
+            index='message_owner_date_id_idx', ordered=True)
+
+    def test_bulk_delete(self):
+        self.assertIndexed(Message.objects.filter(id__in=[1, 2, 3], owner=self.user))
+        # Lecture d'un lot du moteur de suppression
+        self.assertIndexed(
+            Message.objects.filter(owner=self.user).order_by('-date_envoi', '-id')
+            .values_list('pk', 'date_envoi', 'owner_id', 'recipient_id')[:1000],
+            index='message_owner_date_id_idx', ordered=True)
+
+    def test_dashboard_feed(self):
+        first = views._dashboard_feed().order_by('-date_envoi', '-id')[:51]
+        self.assertIndexed(first, index='message_date_id_idx', ordered=True)
+
+        cursor = encode_cursor(Message(pk=10, date_envoi=timezone.now()))
+        queryset = after_cursor(
+            views._dashboard_feed().order_by('-date_envoi', '-id'), cursor)
+        self.assertIndexed(queryset[:51], ordered=True)
+        self.assertIn('SEARCH mymessages_message USING INDEX message_date_id_idx',
+                      self.plan(queryset[:51]))
+
+    def test_owner_stats_rebuild(self):
+        plan = self.plan(Message.objects.values('owner_id').annotate(
+            count=Count('id')).order_by())
+        self.assertRegex(plan, r'COVERING INDEX message_owner_(date_id|modified)_idx')
+
+    def test_inbox_version(self):
+        # Mêmes agrégats que summary.version sans cache partagé
+        received = Message.objects.filter(recipient=self.user).values('recipient').annotate(
+            count=Count('id'), modified=Max('modified')).order_by()
+        self.assertIn('COVERING INDEX message_recipient_modified_idx', self.plan(received))
+        sent = Message.objects.filter(owner=self.user).values('owner').annotate(
+            modified=Max('modified')).order_by()
+        self.assertIn('COVERING INDEX message_owner_modified_idx', self.plan(sent))
+
+
+class MessageSearchTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+        self.deploy = Message.objects.create(
+            contenu="Le déploiement est terminé", owner=self.alice)
+        self.doc = Message.objects.create(
+            contenu="Documentation du déploiement : déploiement en deux étapes",
+            owner=self.bob, recipient=self.alice)
+        Message.objects.create(contenu="Déploiement de Bob", owner=self.bob)
+
+    def search(self, **params):
+        self.client.login(username='alice', password='password')
+        response = self.client.get(reverse('message_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [message.pk for message in response.context['messages']]
+
+    def test_search_words_and_authors(self):
+        """Recherche par début de mot, sans accents, et par auteur"""
+        self.assertEqual(sorted(self.search(q='deploi')), sorted([self.deploy.pk, self.doc.pk]))
+        self.assertEqual(self.search(q='TERMINE'), [self.deploy.pk])
+        self.assertEqual(self.search(q='bo'), [self.doc.pk])
+        self.assertEqual(self.search(q='introuvable'), [])
+
+    def test_index_follows_writes(self):
+        """L'index plein texte suit les modifications et suppressions"""
+        self.deploy.contenu = "Migration reportée"
+        self.deploy.save()
+        self.assertEqual(self.search(q='reportee'), [self.deploy.pk])
+        self.assertEqual(self.search(q='termine'), [])
+
+        self.deploy.delete()
+        self.assertEqual(self.search(q='reportee'), [])
+
+    def test_rank_ordering(self):
+        """Le tri par pertinence classe d'abord le message le plus proche"""
+        self.assertEqual(
+            self.search(q='déploiement étapes', ordering='rank'), [self.doc.pk])
+        ranked = self.search(q='déploiement', ordering='rank')
+        self.assertEqual(ranked[0], self.doc.pk)
+
+
+class InboxQueryTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+        start = timezone.now()
+        senders = [self.alice, self.bob, None]
+        recipients = [self.bob, self.alice, self.alice, None]
+        Message.objects.bulk_create(
+            Message(contenu=f"Msg {i}", owner=senders[i % 3],
+                    recipient=recipients[i % 4],
+                    date_envoi=start - datetime.timedelta(minutes=i // 2))
+            for i in range(60))
+        # Message envoyé à soi-même : ne doit apparaître qu'une fois
+        Message.objects.create(contenu="Note", owner=self.alice, recipient=self.alice)
+
+    def test_pages_match_or_query(self):
+        """La fusion des deux sous-requêtes donne les mêmes pages que le OR"""
+        for descending in (True, False):
+            ordering = ('-date_envoi', '-id') if descending else ('date_envoi', 'id')
+            expected = list(Message.objects.filter(
+                Q(owner=self.alice) | Q(recipient=self.alice)).order_by(*ordering))
+            inbox = InboxQuery(self.alice, descending=descending)
+            self.assertEqual(inbox.count(), len(expected))
+            paginator = Paginator(inbox, 10)
+            pages = []
+            for number in paginator.page_range:
+                pages.extend(paginator.page(number).object_list)
+            self.assertEqual(pages, expected)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_list_view_queries(self):
+        """Une page : deux comptages, deux fenêtres indexées, une lecture groupée"""
+        cache.clear()
+        self.client.login(username='alice', password='password')
+        # Résumé de boîte en cache : base.html n'ajoute aucune requête
+        self.client.get(reverse('message_list'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('message_list'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['messages']), 10)
+        self.assertEqual(len([query for query in ctx.captured_queries
+                              if 'mymessages_message' in query['sql']]), 5)
+        self.assertContains(response, "À : bob")
+
+    @skipUnless(connection.vendor == 'sqlite', "Plans d'exécution propres à SQLite")
+    def test_subqueries_use_index_order(self):
+        """Chaque sous-requête est servie triée par son index"""
+        inbox = InboxQuery(self.alice)
+        for queryset, index in ((inbox.sent, 'message_owner_date_id_idx'),
+                                (inbox.received, 'message_recipient_date_id_idx')):
+            plan = queryset.values_list('date_envoi', 'id')[:100].explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class InboxSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+        self.sent = Message.objects.create(
+            contenu="Bonjour", owner=self.alice, recipient=self.bob)
+        Message.objects.create(contenu="Salut", owner=self.bob, recipient=self.alice)
+        Message.objects.create(contenu="Re", owner=self.bob, recipient=self.alice)
+
+    def assertSummary(self, user, received, sent):
+        result = summary.get_summary(user)
+        self.assertEqual((result['received'], result['sent']), (received, sent))
+
+    def test_summary_is_cached(self):
+        """Le résumé est lu en base une fois, puis servi par le cache"""
+        self.assertSummary(self.alice, 2, 1)
+        with self.assertNumQueries(0):
+            self.assertSummary(self.alice, 2, 1)
+        self.assertEqual(summary.get_summary(self.alice)['last_message'],
+                         Message.objects.latest('date_envoi').date_envoi)
+
+    def test_writes_invalidate_summary(self):
+        """Création, modification, suppression, import et suppression groupée"""
+        self.assertSummary(self.alice, 2, 1)
+        self.assertSummary(self.bob, 1, 2)
+
+        Message.objects.create(contenu="Encore", owner=self.bob, recipient=self.alice)
+        self.assertSummary(self.alice, 3, 1)
+
+        self.sent.recipient = None
+        self.sent.save()
+        self.assertSummary(self.bob, 0, 3)
+
+        self.sent.delete()
+        self.assertSummary(self.alice, 3, 0)
+
+        MessageImportService().import_csv(io.BytesIO(
+            "Importé,2025-01-01 10:00,alice,bob\n".encode()))
+        self.assertSummary(self.alice, 3, 1)
+        self.assertSummary(self.bob, 1, 3)
+
+        self.client.login(username='bob', password='password')
+        self.client.post(reverse('message_bulk_delete'), {
+            'message_ids': list(Message.objects.filter(
+                owner=self.bob).values_list('id', flat=True))})
+        self.assertSummary(self.alice, 0, 1)
+        self.assertSummary(self.bob, 1, 0)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_base_template_counts(self):
+        """base.html affiche les compteurs sans requête sur cache chaud"""
+        # Cache partagé : la version de la boîte est lue dans le résumé
+        cache.clear()
+        self.client.login(username='alice', password='password')
+        response = self.client.get(reverse('message_list'))
+        self.assertContains(response, '<span class="badge">2</span>')
+        self.assertContains(response, '<span class="badge">1</span>')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('message_list'))
+        self.assertFalse([query for query in ctx.captured_queries
+                          if 'mymessagestat' in query['sql']
+                          or 'MAX(' in query['sql']])
+
+
+class RealtimeEventsTest(TransactionTestCase):
+    # Écritures réellement validées : NOTIFY n'est envoyé qu'au commit
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+        # Le thread d'écoute (PostgreSQL) garde sa propre connexion
+        self.addCleanup(realtime.listener.stop)
+
+    async def open_stream(self, username):
+        await self.async_client.alogin(username=username, password='password')
+        response = await self.async_client.get(reverse('message_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        # Premier commentaire : l'abonnement est enregistré
+        self.assertTrue((await anext(stream)).startswith(b":"))
+        return stream
+
+    async def next_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), timeout=5)
+        data = chunk.decode().split("data: ", 1)[1]
+        return json.loads(data)
+
+    async def test_recipient_receives_new_message(self):
+        """Le destinataire reçoit le message créé, sans recharger la liste"""
+        stream = await self.open_stream('bob')
+        await Message.objects.acreate(contenu="Coucou", owner=self.alice, recipient=self.bob)
+        event = await self.next_event(stream)
+        self.assertEqual((event['contenu'], event['owner'], event['recipient']),
+                         ("Coucou", 'alice', 'bob'))
+        await stream.aclose()
+
+    async def test_closed_stream_unsubscribes(self):
+        """Une connexion fermée ne reçoit plus rien et libère sa file"""
+        stream = realtime.event_stream(self.bob.pk)
+        await anext(stream)
+        self.assertTrue(realtime.broker.has_subscribers({self.bob.pk}))
+        await stream.aclose()
+        self.assertFalse(realtime.broker.has_subscribers({self.bob.pk}))
+
+    async def test_import_publishes_messages(self):
+        """Les messages importés sont poussés aux destinataires"""
+        stream = await self.open_stream('bob')
+        csv_file = io.BytesIO(
+            "Un,2025-01-01 10:00,alice,bob\nDeux,2025-01-01 11:00,alice\n".encode())
+        await sync_to_async(MessageImportService().import_csv)(csv_file)
+        event = await self.next_event(stream)
+        self.assertEqual(event['contenu'], "Un")
+        await stream.aclose()
+
+    @skipUnless(realtime.uses_notify(connection), "LISTEN/NOTIFY propre à PostgreSQL")
+    async def test_rolled_back_write_is_not_pushed(self):
+        """Seules les écritures validées sont diffusées aux autres processus"""
+        stream = await self.open_stream('bob')
+        self.assertTrue(realtime.listener.ready.is_set())
+
+        def write_then_rollback():
+            with transaction.atomic():
+                Message.objects.create(contenu="Annulé", owner=self.alice, recipient=self.bob)
+                transaction.set_rollback(True)
+            Message.objects.create(contenu="Validé", owner=self.alice, recipient=self.bob)
+
+        await sync_to_async(write_then_rollback)()
+        self.assertEqual((await self.next_event(stream))['contenu'], "Validé")
+        await stream.aclose()
+
+    def test_anonymous_forbidden(self):
+        response = self.client.get(reverse('message_events'))
+        self.assertEqual(response.status_code, 403)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', password='password')
+        self.bob = User.objects.create_user(
+            username='bob', password='password')
+        Message.objects.bulk_create(
+            Message(contenu=f"Msg {i}", owner=self.alice, recipient=self.bob)
+            for i in range(15))
+        self.message = Message.objects.create(
+            contenu="Dernier", owner=self.bob, recipient=self.alice)
+
+    def test_read_views_are_async(self):
+        for url in (reverse('message_list'),
+                    reverse('message_detail', args=[self.message.pk])):
+            self.assertIsInstance(resolve(url).func.view_class(),
+                                  views.AsyncLoginRequiredMixin)
+
+    async def test_list_and_detail(self):
+        """Liste paginée et détail servis sous ASGI, sans accès synchrone à la base"""
+        await self.async_client.alogin(username='alice', password='password')
+        response = await self.async_client.get(reverse('message_list'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['messages']), 6)
+        self.assertEqual(response.context['page_obj'].paginator.count, 16)
+
+        response = await self.async_client.get(reverse('message_list'), {'page': 'last'})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        response = await self.async_client.get(reverse('message_list'), {'page': 9})
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get(
+            reverse('message_detail', args=[self.message.pk]))
+        self.assertContains(response, "Dernier")
+        response = await self.async_client.get(reverse('message_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_anonymous_redirected(self):
+        response = await self.async_client.get(reverse('message_list'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response['Location'])
+
+    async def test_health_check(self):
+        response = await self.async_client.get('/health/')
+        self.assertContains(response, "OK")
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], DATABASE_REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTest(TestCase):
+    # replica_0 : un second SQLite (voir settings), vide de tout message
+    databases = {'default', 'replica_0'}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        request = self.factory.get('/')
+        SessionMiddleware(lambda request: None).process_request(request)
+        self.session = request.session
+
+    def read_alias(self, view, method='get'):
+        """Base de lecture vue par ``view`` derrière le middleware de routage."""
+        request = getattr(self.factory, method)('/')
+        request.session = self.session
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            seen['db'] = Message.objects.all().db
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        middleware(request)
+        return seen['db']
+
+    def test_read_views_use_replica(self):
+        """Seules les vues de lecture marquées lisent sur le réplica"""
+        self.assertEqual(self.read_alias(replica_reads(lambda request: None)), 'replica_0')
+        self.assertEqual(self.read_alias(views.MessageListView.as_view()), 'replica_0')
+        self.assertEqual(self.read_alias(views.home), 'replica_0')
+        self.assertEqual(self.read_alias(views.import_messages), 'default')
+        # Hors requête, et pour toute écriture : le primaire
+        self.assertEqual(Message.objects.all().db, 'default')
+        self.assertEqual(router.db_for_write(Message), 'default')
+
+    def test_post_pins_session_to_primary(self):
+        """Après une écriture, la session lit ses propres écritures sur le primaire"""
+        view = views.MessageListView.as_view()
+        self.assertEqual(self.read_alias(views.bulk_delete_messages, 'post'), 'default')
+        self.assertEqual(self.read_alias(view), 'default')
+
+        self.session[REPLICA_PIN_SESSION_KEY] = time.time() - 1
+        self.assertEqual(self.read_alias(view), 'replica_0')
+
+    def test_reads_executed_on_replica(self):
+        """Les lectures de la vue partent réellement sur la base du réplica"""
+        user = User.objects.create_user(username='replica_reader', password='x')
+        Message.objects.create(contenu="Primaire seulement", owner=user)
+        request = self.factory.get('/')
+        request.session = self.session
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, views.MessageListView.as_view(), (), {})
+            seen['count'] = Message.objects.count()
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        with CaptureQueriesContext(connections['replica_0']) as replica_queries, \
+                CaptureQueriesContext(connection) as primary_queries:
+            middleware(request)
+        self.assertEqual(seen['count'], 0)
+        self.assertEqual(len(replica_queries), 1)
+        self.assertEqual(len(primary_queries), 0)
+
+    async def test_async_chain(self):
+        """Sous ASGI, le middleware reste asynchrone et épingle la session après un POST"""
+        seen = {}
+
+        async def get_response(request):
+            seen['view_is_async'] = True
+            middleware.process_view(request, views.MessageListView.as_view(), (), {})
+            seen['db'] = Message.objects.all().db
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        request = self.factory.get('/')
+        request.session = self.session
+        await middleware(request)
+        self.assertEqual(seen['db'], 'replica_0')
+
+        request = self.factory.post('/')
+        request.session = self.session
+        await middleware(request)
+        self.assertGreater(await self.session.aget(REPLICA_PIN_SESSION_KEY), time.time())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replica(self):
+        self.assertEqual(self.read_alias(views.MessageListView.as_view()), 'default')
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=10000,
+                   REQUEST_METRICS_MAX_QUERIES=100)
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.message = Message.objects.create(contenu="Bonjour", owner=self.alice)
+        self.client.login(username='alice', password='password')
+
+    def get_logged(self, url, level='INFO'):
+        with self.assertLogs('mymessages.requests', level) as logs:
+            response = self.client.get(url)
+        return response, json.loads(logs.records[-1].getMessage())
+
+    def test_metrics_in_header_and_log(self):
+        """Requêtes SQL, rendu et taille dans Server-Timing et dans le log"""
+        response, entry = self.get_logged(reverse('message_list'))
+        self.assertEqual(entry['view'], 'message_list')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['template_ms'], 0)
+        self.assertEqual(entry['size'], len(response.content))
+        self.assertFalse(entry['flagged'])
+        self.assertIn(f'desc="{entry["queries"]} queries"', response['Server-Timing'])
+        self.assertRegex(response['Server-Timing'], r'tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_threshold_flags_request(self):
+        with self.settings(REQUEST_METRICS_MAX_QUERIES=0):
+            _, entry = self.get_logged(
+                reverse('message_detail', args=[self.message.pk]), level='WARNING')
+        self.assertTrue(entry['flagged'])
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_middleware_is_removed(self):
+        response = self.client.get(reverse('message_list'))
+        self.assertNotIn('Server-Timing', response)
+
+    async def test_async_view_queries_counted(self):
+        await self.async_client.alogin(username='alice', password='password')
+        with self.assertLogs('mymessages.requests', 'INFO'):
+            response = await self.async_client.get(
+                reverse('message_detail', args=[self.message.pk]))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    async def test_async_chain(self):
+        """Sous ASGI, le middleware reste asynchrone et compte les requêtes du thread"""
+        async def get_response(request):
+            await User.objects.acount()
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs('mymessages.requests', 'INFO') as logs:
+            response = await middleware(RequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['queries'], 1)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(METRICS_DIR=self.tmp.name, METRICS_TOKEN='jeton')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.client.login(username='alice', password='password')
+
+    def scrape(self):
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer jeton'})
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                series, value = line.rsplit(' ', 1)
+                samples[series] = float(value)
+        return samples
+
+    def test_requests_and_caches(self):
+        """Latence par nom d'URL et consultations du cache de résumé"""
+        before = self.scrape()
+        self.client.get(reverse('message_list'))
+        after = self.scrape()
+
+        series = 'messagerie_requests_total{status="200",view="message_list"}'
+        self.assertEqual(after[series] - before.get(series, 0), 1)
+        count = 'messagerie_request_duration_seconds_count{view="message_list"}'
+        self.assertEqual(after[count] - before.get(count, 0), 1)
+        self.assertIn('messagerie_request_duration_seconds_bucket{view="message_list",le="+Inf"}', after)
+        miss = 'messagerie_cache_requests_total{cache="inbox_summary",result="miss"}'
+        self.assertEqual(after[miss] - before.get(miss, 0), 1)
+
+    def test_access(self):
+        """Jeton du collecteur ou session du staff ; sinon 401"""
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer autre'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="metrics"')
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+        User.objects.create_user(username='ops', password='password', is_staff=True)
+        self.client.login(username='ops', password='password')
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with override_settings(METRICS_TOKEN=''):
+            # Sans jeton configuré, aucun en-tête n'ouvre l'accès
+            self.client.logout()
+            self.assertEqual(self.client.get(
+                '/metrics', headers={'Authorization': 'Bearer '}).status_code, 401)
+
+    def test_unnamed_route(self):
+        """Une URL sans nom est comptée sous son motif, jamais sous son chemin"""
+        request = RequestFactory().get('/messages/7/')
+        request.resolver_match = mock.Mock(view_name=None, route='messages/<int:pk>/')
+        MetricsMiddleware._observe(request, HttpResponse(), time.perf_counter())
+        self.assertIn('messagerie_requests_total{status="200",view="messages/<int:pk>/"}',
+                      self.scrape())
+
+    def test_import_throughput(self):
+        before = self.scrape()
+        MessageImportService().import_csv(SimpleUploadedFile('m.csv', (
+            "A,2024-01-01 10:00:00,alice\n"
+            "B,2024-01-01 11:00:00,inconnu\n").encode('utf-8')))
+        after = self.scrape()
+        for result, delta in (('imported', 1), ('rejected', 1)):
+            series = f'messagerie_import_rows_total{{result="{result}"}}'
+            self.assertEqual(after[series] - before.get(series, 0), delta)
+        self.assertGreater(after['messagerie_import_seconds_total'],
+                           before.get('messagerie_import_seconds_total', 0))
+
+    async def test_async_chain(self):
+        """Sous ASGI, le middleware reste asynchrone"""
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_FLUSH_SECONDS=0)
+    def test_flush_off_request_path(self):
+        """Le fichier est écrit par un autre thread que celui de la requête"""
+        registry = metrics.Registry()
+        written = threading.Event()
+        threads = []
+
+        def flush():
+            threads.append(threading.current_thread())
+            written.set()
+
+        with mock.patch.object(registry, 'flush', side_effect=flush):
+            registry.inc('messagerie_requests_total')
+            self.assertTrue(written.wait(5))
+        self.assertNotEqual(threads, [threading.current_thread()])
+
+    def test_files_of_other_processes_are_added(self):
+        """Chaque worker écrit son fichier ; /metrics les additionne"""
+        series = 'messagerie_pdf_render_seconds'
+        metrics.observe(series, 0.02, {'report': 'stats'})
+        before = self.scrape()
+        with open(os.path.join(self.tmp.name, '999999.json'), 'w') as f:
+            json.dump({'counters': {}, 'histograms': {series: {'report="stats"': {
+                'buckets': [0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1], 'sum': 0.02, 'count': 1}}}}, f)
+        after = self.scrape()
+        self.assertEqual(after[f'{series}_count{{report="stats"}}'],
+                         before[f'{series}_count{{report="stats"}}'] + 1)
+        self.assertEqual(after[f'{series}_bucket{{report="stats",le="0.025"}}'],
+                         before[f'{series}_bucket{{report="stats",le="0.025"}}'] + 1)
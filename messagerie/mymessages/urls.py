@@ -1,16 +1,27 @@
 
+from django.conf import settings
 from django.urls import path
 
-from mymessages.views import MessageCreateView, MessageDeleteView, MessageDetailView, MessageListView, MessageUpdateView, import_messages, bulk_delete_messages, export_stats_pdf
+from mymessages.views import AsyncMessageDetailView, AsyncMessageListView, MessageCreateView, MessageDeleteView, MessageDetailView, MessageListView, MessageUpdateView, import_messages, import_job_status, message_events, bulk_delete_messages, export_messages, export_stats_pdf, user_autocomplete
 
+# Vues de lecture asynchrones sous ASGI ; MESSAGE_ASYNC_VIEWS=0 rétablit les
+# vues synchrones (profil WSGI, comparaison de charge).
+if settings.MESSAGE_ASYNC_VIEWS:
+    list_view, detail_view = AsyncMessageListView, AsyncMessageDetailView
+else:
+    list_view, detail_view = MessageListView, MessageDetailView
 
 urlpatterns = [
-    path('', MessageListView.as_view(), name='message_list'),
+    path('', list_view.as_view(), name='message_list'),
     path('create/', MessageCreateView.as_view(), name='message_create'),
     path('import/', import_messages, name='message_import'),
+    path('events/', message_events, name='message_events'),
+    path('users/autocomplete/', user_autocomplete, name='user_autocomplete'),
+    path('import/jobs/<int:pk>/', import_job_status, name='import_job_status'),
+    path('export/<str:export_format>/', export_messages, name='export_messages'),
     path('export-stats/', export_stats_pdf, name='export_stats_pdf'),
     path('bulk-delete/', bulk_delete_messages, name='message_bulk_delete'),
-    path('<int:pk>/', MessageDetailView.as_view(), name='message_detail'),
+    path('<int:pk>/', detail_view.as_view(), name='message_detail'),
     path('<int:pk>/update/', MessageUpdateView.as_view(), name='message_update'),
     path('<int:pk>/delete/', MessageDeleteView.as_view(), name='message_delete'),
 ]
@@ -1,35 +1,60 @@
+import hashlib
 from collections.abc import Sequence
 from typing import Any
 from django.db.models.query import QuerySet
-from django.shortcuts import render, redirect
-from django.http import FileResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
+from django.core.paginator import InvalidPage, Page
 from django.contrib import messages
-import io
-from reportlab.pdfgen import canvas
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.template.loader import render_to_string
 from reportlab.lib.pagesizes import letter
 from django.contrib.auth.decorators import login_required, permission_required
-from django.views.decorators.http import require_POST
-from .models import Message
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition, require_POST
+from . import autocomplete, deletion, exports, jobs, metrics, realtime, reports, stats, summary
+from .forms import MessageForm
+from .models import ImportJob, Message
+from .inbox import InboxQuery
+from .pagination import keyset_page
+from .routers import replica_reads
+from .search import get_search_backend
+from .pdf import StreamingCanvas
 from django.views.generic import ListView, DetailView, DeleteView, UpdateView, CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 from django.db.models import Q  # Optional: for complex lookups
-from .services import MessageImportService
-from django.db.models.functions import TruncDay
-from django.db.models import Count
 import json
 
+# À incrémenter quand les gabarits de la liste ou du détail changent :
+# invalide les pages gardées par les navigateurs
+INBOX_ETAG_VERSION = 1
 
+# Nombre de messages lus par requête lors de l'export PDF
+PDF_EXPORT_CHUNK_SIZE = 2000
+
+# Nombre de messages par page du fil du tableau de bord
+HOME_FEED_PAGE_SIZE = 50
+
+
+def _dashboard_feed():
+    return Message.objects.select_related('owner', 'recipient').only(
+        'contenu', 'date_envoi', 'modified', 'owner__username', 'recipient__username')
+
+
+@replica_reads
 @login_required
 def home(request):
     if request.user.is_superuser == False:
         return redirect('message_list')
-    # On récupère tous les messages
-    messages_liste = Message.objects.all().order_by('-date_envoi')
+    # Première page du fil des messages, la suite est chargée au défilement
+    messages_liste, next_cursor = keyset_page(
+        _dashboard_feed(), size=HOME_FEED_PAGE_SIZE)
 
     # Préparation des données pour le graphique (Messages par jour)
-    daily_stats = Message.objects.annotate(date=TruncDay('date_envoi')).values(
-        'date').annotate(count=Count('id')).order_by('date')
+    daily_stats = stats.daily_stats()
 
     # Conversion des données pour Chart.js
     labels = [stat['date'].strftime('%d/%m/%Y')
@@ -37,14 +62,14 @@ def home(request):
     data = [stat['count'] for stat in daily_stats if stat['date']]
 
     # Préparation des données pour le graphique (Messages par utilisateur)
-    user_stats = Message.objects.values('owner__username').annotate(
-        count=Count('id')).order_by('-count')
+    user_stats = stats.user_stats()
     user_labels = [stat['owner__username'] if stat['owner__username']
                    else 'Anonyme' for stat in user_stats]
     user_data = [stat['count'] for stat in user_stats]
 
     return render(request, 'index.html', {
         'messages_liste': messages_liste,
+        'next_cursor': next_cursor,
         # Vérifie si l'utilisateur a la permission d'ajouter un message
         'can_post': request.user.has_perm('mymessages.add_message'),
         'chart_labels': json.dumps(labels),
@@ -54,6 +79,25 @@ def home(request):
     })
 
 
+@replica_reads
+@login_required
+def home_feed(request):
+    """Page suivante du fil du tableau de bord (défilement infini), en JSON."""
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    try:
+        messages_liste, next_cursor = keyset_page(
+            _dashboard_feed(), request.GET.get('cursor'), HOME_FEED_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': "Curseur invalide"}, status=400)
+
+    return JsonResponse({
+        'html': render_to_string('message_feed_items.html', {
+            'messages_liste': messages_liste}, request=request),
+        'next_cursor': next_cursor,
+    })
+
+
 @login_required
 @permission_required('mymessages.add_message', raise_exception=True)
 @require_POST
@@ -71,65 +115,94 @@ def add_message(request):
     return redirect('home')
 
 
+async def message_events(request):
+    """Flux SSE des messages envoyés et reçus par l'utilisateur connecté."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+    response = StreamingHttpResponse(
+        realtime.event_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un proxy nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def import_messages(request):
     if request.method == 'POST' and request.FILES.get('csv_file'):
-        csv_file = request.FILES['csv_file']
-        service = MessageImportService()
-        success_count, error_count = service.import_csv(csv_file)
-
-        if success_count > 0:
-            messages.success(
-                request, f"{success_count} messages importés avec succès.")
-        if error_count > 0:
-            messages.warning(
-                request, f"{error_count} lignes ignorées (erreurs ou en-tête).")
+        # L'import est confié au worker (process_import_jobs) : la requête
+        # rend la main immédiatement, la progression est suivie en JSON.
+        job = jobs.create_job(request.user, request.FILES['csv_file'])
+        messages.info(
+            request, f"Import n°{job.pk} en file d'attente, la progression s'affiche ci-dessous.")
         return redirect('message_import')
 
-    return render(request, 'import_messages.html')
+    recent_jobs = ImportJob.objects.filter(owner=request.user).order_by('-created')[:5]
+    return render(request, 'import_messages.html', {'jobs': recent_jobs})
+
+
+@login_required
+def import_job_status(request, pk):
+    job = get_object_or_404(ImportJob, pk=pk, owner=request.user)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.is_finished,
+        'success_count': job.success_count,
+        'error_count': job.error_count,
+        'errors': job.errors,
+    })
 
 
 @login_required
 @require_POST
 def bulk_delete_messages(request):
-    message_ids = request.POST.getlist('message_ids')
-    if message_ids:
-        # On filtre par ID et on s'assure que l'utilisateur est bien le propriétaire
-        deleted_count, _ = Message.objects.filter(
-            id__in=message_ids,
-            owner=request.user
-        ).delete()
-
-        if deleted_count > 0:
-            messages.success(request, f"{deleted_count} messages supprimés.")
+    # On ne supprime que les messages dont l'utilisateur est le propriétaire
+    own_messages = Message.objects.filter(owner=request.user)
+    search_query = request.POST.get('q')
+    deleted_count = 0
+    if request.POST.get('all_matching') and search_query:
+        # « Tout supprimer » sur une recherche : pas de liste d'identifiants
+        deleted_count = deletion.delete_messages(
+            get_search_backend().search(own_messages, search_query))
+    else:
+        message_ids = [pk for pk in request.POST.getlist('message_ids') if pk.isdigit()]
+        # Lots bornés : un id__in géant dépasse la limite de paramètres SQL
+        for start in range(0, len(message_ids), deletion.CHUNK_SIZE):
+            deleted_count += deletion.delete_messages(own_messages.filter(
+                id__in=message_ids[start:start + deletion.CHUNK_SIZE]))
+
+    if deleted_count > 0:
+        messages.success(request, f"{deleted_count} messages supprimés.")
 
     return redirect('message_list')
 
 
-@login_required
-def export_messages_pdf(request):
-    # Crée un buffer en mémoire pour le PDF
-    buffer = io.BytesIO()
-    # Crée l'objet PDF via ReportLab
-    p = canvas.Canvas(buffer, pagesize=letter)
+def _stream_messages_pdf(username, messages):
+    # Durée mesurée sur tout le flux, jusqu'au dernier octet produit
+    with metrics.timer('messagerie_pdf_render_seconds', {'report': 'messages'}):
+        yield from _messages_pdf_parts(username, messages)
+
+
+def _messages_pdf_parts(username, messages):
+    p = StreamingCanvas(pagesize=letter)
     width, height = letter
+    yield p.begin()
 
     # En-tête du PDF
     p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, height - 50, f"Messages de {request.user.username}")
+    p.drawString(50, height - 50, f"Messages de {username}")
 
     # Contenu
     p.setFont("Helvetica", 12)
     y = height - 80
 
-    # Récupération des messages de l'utilisateur
-    messages = Message.objects.filter(
-        owner=request.user).order_by('-date_envoi')
-
     for message in messages:
-        # Gestion du saut de page
+        # Gestion du saut de page : la page pleine part tout de suite au client
         if y < 50:
-            p.showPage()
+            yield p.showPage()
             y = height - 50
             p.setFont("Helvetica", 12)
 
@@ -139,70 +212,76 @@ def export_messages_pdf(request):
         p.drawString(50, y, text[:90] + ('...' if len(text) > 90 else ''))
         y -= 20
 
-    p.showPage()
-    p.save()
-
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename='mes_messages.pdf')
+    yield p.showPage()
+    yield p.save()
 
 
+@replica_reads
 @login_required
-def export_stats_pdf(request):
-    # Crée un buffer en mémoire pour le PDF
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
+def export_messages_pdf(request):
+    # Les messages sont lus par paquets et le PDF envoyé page par page :
+    # la mémoire utilisée ne dépend pas du nombre de messages.
+    messages = Message.objects.filter(
+        owner=request.user).order_by('-date_envoi').only('date_envoi', 'contenu')
+    # Le flux est lu après la fin de la vue : on fige la base choisie maintenant
+    messages = messages.using(messages.db).iterator(chunk_size=PDF_EXPORT_CHUNK_SIZE)
 
-    # En-tête
-    p.setFont("Helvetica-Bold", 18)
-    p.drawString(50, height - 50, "Rapport Statistique - Messagerie DevOps")
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 70, f"Généré par : {request.user.username}")
+    response = StreamingHttpResponse(
+        _stream_messages_pdf(request.user.username, messages),
+        content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename="mes_messages.pdf"'
+    return response
 
-    # Récupération des données (identique à la vue home)
-    daily_stats = Message.objects.annotate(date=TruncDay('date_envoi')).values(
-        'date').annotate(count=Count('id')).order_by('date')
-    user_stats = Message.objects.values('owner__username').annotate(
-        count=Count('id')).order_by('-count')
 
-    y = height - 110
+@replica_reads
+@login_required
+def export_messages(request, export_format):
+    if export_format not in exports.FORMATS:
+        raise Http404("Format d'export inconnu")
+    stream, content_type, filename = exports.FORMATS[export_format]
+    try:
+        rows = exports.filter_messages(request.user, request.GET)
+    except ValidationError as exc:
+        return HttpResponseBadRequest(" ".join(exc.messages))
+    # Comme pour le PDF : base figée, lecture par paquets pendant l'envoi
+    rows = rows.using(rows.db).iterator(chunk_size=exports.EXPORT_CHUNK_SIZE)
+
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@replica_reads
+@login_required
+def user_autocomplete(request):
+    # ?q=préfixe du nom, ?after=dernier nom de la page précédente
+    return JsonResponse(autocomplete.search_users(
+        request.GET.get('q', '').strip(), request.GET.get('after') or None))
 
-    # Section 1: Activité par jour
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, y, "1. Activité journalière (Nombre de messages)")
-    y -= 25
-    p.setFont("Helvetica", 12)
 
-    for stat in daily_stats:
-        if stat['date']:
-            date_str = stat['date'].strftime('%d/%m/%Y')
-            p.drawString(70, y, f"- {date_str} : {stat['count']} message(s)")
-            y -= 20
-            if y < 50:
-                p.showPage()
-                y = height - 50
-
-    y -= 20
-    # Section 2: Répartition par utilisateur
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, y, "2. Répartition par utilisateur")
-    y -= 25
-    p.setFont("Helvetica", 12)
+def _stats_report_etag(request):
+    # Clé calculée une seule fois : réutilisée par la vue si le client n'a pas le PDF
+    request.stats_report_key = reports.stats_report_key(request.user.username)
+    return request.stats_report_key
 
-    for stat in user_stats:
-        username = stat['owner__username'] if stat['owner__username'] else 'Anonyme'
-        p.drawString(70, y, f"- {username} : {stat['count']} message(s)")
-        y -= 20
 
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename='statistiques_dashboard.pdf')
+@replica_reads
+@login_required
+@condition(etag_func=_stats_report_etag)
+def export_stats_pdf(request):
+    report, _, cached = reports.get_stats_report(
+        request.user.username, key=request.stats_report_key)
+    response = FileResponse(report, as_attachment=True,
+                            filename='statistiques_dashboard.pdf')
+    # Le navigateur revalide à chaque fois : 304 tant que rien n'a changé
+    patch_cache_control(response, private=True, no_cache=True)
+    response['X-Cache'] = 'HIT' if cached else 'MISS'
+    return response
 
 
 class MessageCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
     model = Message
-    fields = ['contenu', 'recipient']
+    form_class = MessageForm
     template_name = 'message_form.html'
     success_url = '/messages/'
     permission_required = 'mymessages.add_message'
@@ -213,58 +292,209 @@ class MessageCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView)
         return super().form_valid(form)
 
 
-class MessageListView(LoginRequiredMixin, ListView):
+class InboxConditionalMixin:
+    """GET conditionnel (ETag) sur la version de la boîte.
+
+    La version vient du résumé de boîte (``summary.version``), en cache et
+    invalidé à chaque écriture, ou d'agrégats indexés sans cache partagé :
+    une réponse 304 ne lit ni les messages ni ne rend le gabarit. L'ETag
+    inclut le secret CSRF, pour qu'une page gardée par le navigateur
+    n'envoie pas un jeton périmé après une reconnexion. Pas de
+    Last-Modified : une suppression ne fait pas avancer de date.
+    Placé après ``LoginRequiredMixin`` : l'utilisateur est authentifié.
+    """
+
+    def get_etag(self):
+        """Renvoie l'ETag de la boîte, ou None pour ne rien valider."""
+        label = summary.version(self.request.user)
+        # Secret du cookie CSRF, créé ici s'il manque (posé sur la réponse)
+        get_token(self.request)
+        csrf = self.request.META['CSRF_COOKIE']
+        etag = hashlib.sha256(f"{INBOX_ETAG_VERSION}:{label}:{csrf}".encode()).hexdigest()[:32]
+        return f'"{etag}"'
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self._async_dispatch(request, *args, **kwargs)
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        return self._set_etag(response, etag)
+
+    async def _async_dispatch(self, request, *args, **kwargs):
+        # La version peut être relue en base : hors de la boucle d'événements
+        etag = await sync_to_async(self.get_etag)()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = await super().dispatch(request, *args, **kwargs)
+        return self._set_etag(response, etag)
+
+    @staticmethod
+    def _set_etag(response, etag):
+        if etag is None:
+            return response
+        response.headers.setdefault('ETag', etag)
+        # Page propre à l'utilisateur, revalidée à chaque affichage
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class MessageListView(LoginRequiredMixin, InboxConditionalMixin, ListView):
     model = Message
     template_name = 'message_list.html'
     context_object_name = 'messages'
     ordering = ['-date_envoi']
     paginate_by = 10
+    use_replica = True
 
     def get_queryset(self) -> QuerySet[Any]:
         queryset = super().get_queryset()
         search_query = self.request.GET.get('q', None)
         if search_query:
-            queryset = queryset.filter(
-                Q(contenu__icontains=search_query)
-                | Q(owner__username__icontains=search_query)
-            ).distinct()
-        return queryset.filter(
-            Q(owner=self.request.user) | Q(recipient=self.request.user)
-        )
+            backend = get_search_backend()
+            queryset = backend.search(queryset, search_query)
+            if self.request.GET.get('ordering') == 'rank':
+                queryset = backend.annotate_rank(
+                    queryset, search_query).order_by('-rank', '-date_envoi')
+                return queryset.filter(
+                    Q(owner=self.request.user) | Q(recipient=self.request.user)
+                ).select_related('owner', 'recipient')
+        # Tri par date : fusion des messages envoyés et reçus, chacun servi
+        # par son index, plutôt qu'un OR qui force un tri de toute la boîte.
+        return InboxQuery(self.request.user, queryset,
+                          descending=self.get_ordering().startswith('-'))
 
     def get_ordering(self):
         ordering = self.request.GET.get('ordering', '-date_envoi')
+        # 'rank' (pertinence) est appliqué après la recherche, dans get_queryset
+        if ordering not in ('-date_envoi', 'date_envoi'):
+            ordering = '-date_envoi'
         return ordering
 
 
-class MessageDetailView(LoginRequiredMixin, DetailView):
+class MessageObjectMixin:
+    """Résout le message de la requête une seule fois.
+
+    ``test_func`` puis la vue générique (``get``/``post``) demandent tous
+    deux ``get_object()`` : le second appel reprend l'objet déjà lu.
+    """
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_message'):
+            self._message = super().get_object()
+        return self._message
+
+
+class MessageOwnerRequiredMixin(MessageObjectMixin, UserPassesTestMixin):
+    """Réservé au propriétaire du message (ou à un superutilisateur)."""
+
+    def test_func(self):
+        user = self.request.user
+        # owner_id : aucune lecture de l'utilisateur propriétaire
+        return user.is_superuser or self.get_object().owner_id == user.pk
+
+
+class MessageDetailView(LoginRequiredMixin, InboxConditionalMixin, MessageObjectMixin, DetailView):
     model = Message
     template_name = 'message_detail.html'
     context_object_name = 'message'
+    use_replica = True
 
+    def get_etag(self):
+        # Un superutilisateur lit aussi les messages des autres : sa propre
+        # boîte ne dit rien de leur version
+        if self.request.user.is_superuser:
+            return None
+        return super().get_etag()
 
-class MessageDeleteView(LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin, DeleteView):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_superuser:
+            return queryset
+        # Même requête que la lecture : un message d'autrui donne un 404
+        return queryset.filter(Q(owner_id=user.pk) | Q(recipient_id=user.pk))
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """``LoginRequiredMixin`` pour les vues asynchrones.
+
+    La version synchrone lit ``request.user``, une requête de base interdite
+    dans une vue asynchrone. L'utilisateur est résolu par ``auser()`` puis
+    remplace l'objet paresseux : gabarits et processeurs de contexte ne
+    refont pas la requête.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+
+class AsyncMessageListView(AsyncLoginRequiredMixin, MessageListView):
+    """Variante asynchrone de la liste : comptage et page via l'ORM asynchrone."""
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        paginator = self.get_paginator(queryset, self.paginate_by)
+        # Comptage fait ici : le Paginator ne lance plus de requête synchrone
+        paginator.count = await queryset.acount()
+        page = request.GET.get(self.page_kwarg) or 1
+        try:
+            number = paginator.num_pages if page == 'last' else paginator.validate_number(page)
+        except InvalidPage as exc:
+            raise Http404(str(exc))
+        bottom = (number - 1) * paginator.per_page
+        items = await self._aslice(queryset, bottom, bottom + paginator.per_page)
+        page_obj = Page(items, number, paginator)
+
+        self.object_list = items
+        return self.render_to_response({
+            'view': self,
+            'paginator': paginator,
+            'page_obj': page_obj,
+            'is_paginated': page_obj.has_other_pages(),
+            'object_list': items,
+            self.context_object_name: items,
+        })
+
+    @staticmethod
+    async def _aslice(queryset, start, stop):
+        if isinstance(queryset, InboxQuery):
+            return await queryset.aslice(start, stop)
+        return [message async for message in queryset[start:stop]]
+
+
+class AsyncMessageDetailView(AsyncLoginRequiredMixin, MessageDetailView):
+    """Variante asynchrone du détail : une lecture via l'ORM asynchrone."""
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object = await self.get_queryset().select_related(
+                'owner', 'recipient').aget(pk=kwargs['pk'])
+        except Message.DoesNotExist:
+            raise Http404("Message introuvable")
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class MessageDeleteView(LoginRequiredMixin, PermissionRequiredMixin, MessageOwnerRequiredMixin, DeleteView):
     model = Message
     template_name = 'message_confirm_delete.html'
     success_url = '/messages/'
     permission_required = 'mymessages.delete_message'
     raise_exception = True
 
-    def test_func(self):
-        obj = self.get_object()
-        # Utilisation de getattr pour éviter les erreurs de linter (type checker)
-        return getattr(obj, 'owner', None) == self.request.user or self.request.user.is_superuser
-
 
-class MessageUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin, UpdateView):
+class MessageUpdateView(LoginRequiredMixin, PermissionRequiredMixin, MessageOwnerRequiredMixin, UpdateView):
     model = Message
-    fields = ['contenu', 'recipient']
+    form_class = MessageForm
     template_name = 'message_form.html'
     success_url = '/messages/'
     permission_required = 'mymessages.change_message'
     raise_exception = True
-
-    def test_func(self):
-        obj = self.get_object()
-        # Utilisation de getattr pour éviter les erreurs de linter (type checker)
-        return getattr(obj, 'owner', None) == self.request.user or self.request.user.is_superuser
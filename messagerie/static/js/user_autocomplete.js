@@ -0,0 +1,47 @@
+// Sélecteur d'utilisateur : les options sont chargées par préfixe au fil de
+// la saisie (voir UserAutocompleteWidget), jamais la table entière.
+(function() {
+  function setup(select) {
+    var search = select.previousElementSibling;
+    if (!search || !search.classList.contains('user-autocomplete-search')) return;
+    var url = select.dataset.autocompleteUrl;
+    var timer = null;
+    var pending = null;
+
+    function render(results, next) {
+      var current = select.value;
+      // On garde l'option vide et la sélection en cours
+      Array.prototype.slice.call(select.options).forEach(function(option) {
+        if (option.disabled || (option.value && option.value !== current)) option.remove();
+      });
+      results.forEach(function(user) {
+        if (String(user.id) === current) return;
+        select.append(new Option(user.username, user.id));
+      });
+      if (next) {
+        // Page suivante disponible via ?after= : ici, on invite à préciser
+        var more = new Option('… préciser la recherche', '');
+        more.disabled = true;
+        select.append(more);
+      }
+    }
+
+    function lookup(prefix) {
+      if (pending) pending.abort();
+      pending = new AbortController();
+      fetch(url + '?' + new URLSearchParams({q: prefix}), {signal: pending.signal})
+        .then(function(response) { return response.json(); })
+        .then(function(data) { render(data.results, data.next); })
+        .catch(function() {});
+    }
+
+    search.addEventListener('input', function() {
+      clearTimeout(timer);
+      timer = setTimeout(function() { lookup(search.value.trim()); }, 250);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(setup);
+  });
+})();
@@ -0,0 +1,12 @@
+#!/bin/sh
+set -e
+
+# Étape de release : une fois par déploiement, avant le trafic. Le verrou
+# d'apply_migrations rend sans danger des lancements simultanés.
+
+echo "Applying database migrations..."
+python manage.py apply_migrations
+
+# Créer un superutilisateur par défaut si nécessaire
+echo "Creating default superuser..."
+python manage.py createsuperuser --no-input || true